@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch solution of CPMP instances in parallel worker processes
+
+Every instance is solved in a process of its own, at most nworkers at the same time, with the compact model of
+cpmp_compact or the branch-and-price of cpmp_extended. SCIP stops a solve gracefully at the time limit and at the memory
+limit; in addition, the address space of a worker is limited to the memory limit and a worker that is still running
+KILLGRACE seconds after the time limit is killed. A killed or crashed worker only loses its own instance.
+
+The result of every instance is appended to the output file as soon as it is solved, as JSON lines or as CSV (by the
+extension of the output file). Each result records the configuration it was solved with; calling the runner again with
+the same output file and configuration resumes the run, i.e., skips the instances that already have a result.
+
+Example:
+    python batch_cpmp.py "../instances/*/*.cpmp" results.jsonl --model extended --nworkers 4 --timelimit 600 \\
+        --memorylimit 4000 --options '{"startcolumns": true}'
+"""
+
+import argparse
+import contextlib
+import csv
+from dataclasses import asdict, dataclass, field
+import glob
+import json
+import multiprocessing
+from multiprocessing import connection
+import os
+import time
+
+try:
+    import resource
+except ImportError:
+    # no address space limit of the workers, e.g., on Windows
+    resource = None
+
+import cpmp_compact
+import cpmp_extended
+import reader_cpmp
+
+# Models the instances can be solved with
+MODELS = ("compact", "extended")
+
+# Pricing problem solvers of the extended model: the dynamic programming knapsack solver or the MIP solver
+PRICING_SOLVERS = ("knapsack", "mip")
+
+# Result fields, in the column order of CSV output; JSON lines also contain the further statistics of test_cpmp
+RESULT_FIELDS = ("instance", "config", "status", "primalbound", "dualbound", "nnodes", "time", "walltime", "error")
+
+# Seconds after the time limit until a worker is killed
+KILLGRACE = 60.0
+
+# Fraction of the memory limit that is passed to SCIP, which only accounts for its own memory
+SCIPMEMORYFRACTION = 0.8
+
+
+# solver configuration of a batch run
+@dataclass
+class BatchConfig:
+    model: str = "extended"      # one of MODELS
+    pricing: str = "knapsack"    # one of PRICING_SOLVERS, only used by the extended model
+    branching: bool = True       # if False, only the LP relaxation is solved
+    timelimit: float = None      # time limit per instance in seconds, None for no limit
+    memorylimit: float = None    # memory limit per instance in MB, None for no limit
+    options: dict = field(default_factory = dict) # further keyword arguments of test_cpmp resp. build_compact
+
+    """key identifying the configuration in the results"""
+    def key(self):
+        return json.dumps(asdict(self), sort_keys = True)
+
+
+#
+# Worker processes
+#
+
+"""Solve an instance with the compact model
+
+:param filename: instance file
+:param config: BatchConfig
+:return: dictionary of statistics
+"""
+def solve_compact(filename, config):
+    nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance_arrays(filename)
+    model, _, _, _ = cpmp_compact.build_compact(nlocations, nclusters, distances, demands, capacities, solveinteger = config.branching,
+                                                **config.options)
+    if config.timelimit is not None:
+        model.setParam("limits/time", config.timelimit)
+    if config.memorylimit is not None:
+        model.setParam("limits/memory", SCIPMEMORYFRACTION * config.memorylimit)
+    model.optimize()
+
+    return {'status': model.getStatus(),
+            'primalbound': model.getPrimalbound(),
+            'dualbound': model.getDualbound(),
+            'nnodes': model.getNNodes(),
+            'time': model.getSolvingTime()}
+
+"""Solve an instance with the branch-and-price of the extended model
+
+:param filename: instance file
+:param config: BatchConfig
+:return: dictionary of statistics of test_cpmp
+"""
+def solve_extended(filename, config):
+    nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance(filename)
+    # pair branching replaces the semi-assignment branching
+    semiassignmentbranching = config.branching and not config.options.get("pairbranching", False)
+    memorylimit = SCIPMEMORYFRACTION * config.memorylimit if config.memorylimit is not None else None
+
+    return cpmp_extended.test_cpmp(nlocations, nclusters, distances, demands, capacities, config.branching, semiassignmentbranching,
+                                   config.pricing == "mip", timelimit = config.timelimit, memorylimit = memorylimit, **config.options)
+
+"""Solve an instance and send its result to the runner; entry point of the worker processes
+
+:param filename: instance file
+:param config: BatchConfig
+:param logfilename: file the solver output is written to
+:param sender: connection to the runner
+"""
+def solve_worker(filename, config, logfilename, sender):
+    if resource is not None and config.memorylimit is not None:
+        limit = int(config.memorylimit * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    result = {}
+    starttime = time.perf_counter()
+    with open(logfilename, "w") as logfile, contextlib.redirect_stdout(logfile), contextlib.redirect_stderr(logfile):
+        # messages SCIP writes itself, e.g., errors, bypass the Python streams
+        os.dup2(logfile.fileno(), 1)
+        os.dup2(logfile.fileno(), 2)
+        try:
+            result = solve_compact(filename, config) if config.model == "compact" else solve_extended(filename, config)
+        except MemoryError:
+            result = {'status': "memorylimit", 'error': "MemoryError"}
+        except Exception as exception:
+            result = {'status': "error", 'error': repr(exception)}
+    result['walltime'] = time.perf_counter() - starttime
+
+    sender.send(result)
+    sender.close()
+
+
+#
+# Results
+#
+
+"""Instances that already have a result for a configuration in an output file
+
+:param output: output file, JSON lines or CSV
+:param configkey: key of the configuration
+:return: set of instance files
+"""
+def solved_instances(output, configkey):
+    if not os.path.exists(output):
+        return set()
+
+    with open(output, newline = "") as file:
+        if output.endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = []
+            for line in file:
+                # the last line of an interrupted run may be incomplete
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+    return {row["instance"] for row in rows if row.get("config") == configkey}
+
+# appends results to an output file, JSON lines or CSV
+class ResultWriter:
+    def __init__(self, output):
+        self.csv = output.endswith(".csv")
+        writeheader = self.csv and (not os.path.exists(output) or os.path.getsize(output) == 0)
+
+        # the last line of an interrupted run may be incomplete, new results start on a line of their own
+        incomplete = False
+        if os.path.exists(output) and os.path.getsize(output) > 0:
+            with open(output, "rb") as file:
+                file.seek(-1, os.SEEK_END)
+                incomplete = file.read(1) != b"\n"
+
+        self.file = open(output, "a", newline = "")
+        if incomplete:
+            self.file.write("\n")
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, RESULT_FIELDS, extrasaction = "ignore")
+            if writeheader:
+                self.writer.writeheader()
+
+    """Append the result of an instance and flush it to the file"""
+    def write(self, result):
+        if self.csv:
+            self.writer.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+#
+# Runner
+#
+
+"""Solve instances in parallel worker processes and append their results to an output file
+
+:param filenames: instance files
+:param config: BatchConfig
+:param output: output file, JSON lines or CSV (by its extension)
+:param nworkers: number of worker processes, None for the number of available cores
+:param logdir: directory of the solver output of the instances (one file per instance), None to discard it
+:return: list of the results of the instances solved in this run
+"""
+def run_batch(filenames, config, output, nworkers = None, logdir = None):
+    assert config.model in MODELS and config.pricing in PRICING_SOLVERS
+    nworkers = nworkers if nworkers is not None else os.cpu_count()
+    configkey = config.key()
+
+    solved = solved_instances(output, configkey)
+    pending = [filename for filename in map(os.path.abspath, filenames) if filename not in solved]
+    print("%d instances, %d solved before, %d to solve" % (len(filenames), len(filenames) - len(pending), len(pending)))
+    if logdir is not None:
+        os.makedirs(logdir, exist_ok = True)
+
+    results = []
+    # receiving connection of every running worker -> (process, instance, start time)
+    running = {}
+    writer = ResultWriter(output)
+    try:
+        while pending or running:
+            while pending and len(running) < nworkers:
+                filename = pending.pop(0)
+                logfilename = os.path.join(logdir, os.path.basename(filename) + ".log") if logdir is not None else os.devnull
+                receiver, sender = multiprocessing.Pipe(duplex = False)
+                process = multiprocessing.Process(target = solve_worker, args = (filename, config, logfilename, sender))
+                process.start()
+                # the worker holds the only sending end, such that a crash closes the connection
+                sender.close()
+                running[receiver] = (process, filename, time.perf_counter())
+
+            finished = []
+            for receiver in connection.wait(list(running), timeout = 1.0):
+                process, filename, starttime = running[receiver]
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    process.join()
+                    result = {'status': "crashed", 'error': "exit code %s" % process.exitcode,
+                              'walltime': time.perf_counter() - starttime}
+                finished.append((receiver, filename, result))
+
+            if config.timelimit is not None:
+                for receiver, (process, filename, starttime) in running.items():
+                    walltime = time.perf_counter() - starttime
+                    if walltime > config.timelimit + KILLGRACE and all(receiver is not other for other, _, _ in finished):
+                        process.kill()
+                        finished.append((receiver, filename, {'status': "killed", 'walltime': walltime}))
+
+            for receiver, filename, result in finished:
+                process, _, _ = running.pop(receiver)
+                process.join()
+                receiver.close()
+
+                result = {'instance': filename, 'config': configkey, **result}
+                writer.write(result)
+                results.append(result)
+                print("%-40s %-15s %12s %12s %8.1f" % (os.path.basename(filename), result['status'], result.get('primalbound', '-'),
+                                                       result.get('dualbound', '-'), result['walltime']), flush = True)
+    finally:
+        for process, _, _ in running.values():
+            process.kill()
+        writer.close()
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Solve CPMP instances in parallel worker processes")
+    parser.add_argument("instances", help = "glob pattern of the instance files, e.g. '../instances/*/*.cpmp'")
+    parser.add_argument("output", help = "result file, JSON lines (.jsonl) or CSV (.csv); an existing file is resumed")
+    parser.add_argument("--model", choices = MODELS, default = "extended")
+    parser.add_argument("--pricing", choices = PRICING_SOLVERS, default = "knapsack", help = "pricing problem solver of the extended model")
+    parser.add_argument("--no-branching", dest = "branching", action = "store_false", help = "only solve the LP relaxation")
+    parser.add_argument("--timelimit", type = float, default = None, help = "time limit per instance in seconds")
+    parser.add_argument("--memorylimit", type = float, default = None, help = "memory limit per instance in MB")
+    parser.add_argument("--options", type = json.loads, default = {},
+                        help = "JSON object of further keyword arguments of test_cpmp (extended) or build_compact (compact)")
+    parser.add_argument("--nworkers", type = int, default = None, help = "number of worker processes, default: number of cores")
+    parser.add_argument("--logdir", default = None, help = "directory of the solver output of the instances")
+    args = parser.parse_args()
+
+    filenames = sorted(glob.glob(args.instances))
+    config = BatchConfig(args.model, args.pricing, args.branching, args.timelimit, args.memorylimit, args.options)
+    run_batch(filenames, config, args.output, args.nworkers, args.logdir)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pair branching rule for capacitated p-median problems
+
+Branches on the assignment of a location to a median in the compact formulation (Ryan-Foster style): the left child
+forbids the assignment (x_lm = 0), the right child enforces it (x_lm = 1). The pair with the most fractional
+assignment value is chosen.
+"""
+
+from pyscipopt import Branchrule, SCIP_RESULT
+import numpy
+
+EPS = 1.e-10
+
+class BranchruleAssign(Branchrule):
+    def __init__(self, pricer, conshdlr):
+        super().__init__()
+        self.pricer = pricer
+        self.conshdlr = conshdlr
+
+        # Statistics: number of branchings
+        self.nbranchings = 0
+
+    #
+    # Local methods
+    #
+
+    """ for each pair of locations, compute the (possibly fractional) assignment value of the LP solution
+        :returns: matrix of location-median assignments, first index location, second index median
+    """
+    def computeAssignments(self):
+        values = numpy.fromiter((var.getLPSol() for var in self.pricer.patternVars), dtype = float, count = self.pricer.nvars)
+        return self.pricer.columnStore.assignmentMatrix(values)
+
+    """ choose the location-median pair whose assignment value is closest to 0.5
+        :param assignments: matrix of location-median assignments
+        :returns: location and median to branch on, or (-1, -1) in case of integrality
+    """
+    def choosePair(self, assignments):
+        epsilon = self.model.epsilon()
+        fractional = assignments - numpy.floor(assignments + epsilon)
+        candidates = fractional > EPS
+        if not candidates.any():
+            return -1, -1
+
+        distances = numpy.where(candidates, numpy.abs(fractional - 0.5), numpy.inf)
+        location, median = numpy.unravel_index(numpy.argmin(distances), distances.shape)
+        return int(location), int(median)
+
+    """ branch on a pair: create a child that forbids and a child that enforces the assignment of the location to the median
+        :param location: location to branch on
+        :param median: median to branch on
+    """
+    def performBranching(self, location, median):
+        nlocations = self.pricer.nlocations
+
+        # left child: the location may not be assigned to the median
+        leftforbidden = [False] * nlocations
+        leftforbidden[median] = True
+
+        # right child: the location may not be assigned to any other median;
+        # already forbidden assignments are ignored, such that the constraint only stores newly forbidden assignments
+        rightforbidden = [other != median and not self.pricer.isAssignmentForbidden(other, location) for other in range(nlocations)]
+
+        leftChild = self.model.createChild(-self.model.getDualbound(), self.model.getLocalEstimate())
+        cons = self.conshdlr.createConsAssign("forbid_{0}_{1}".format(location, median), location, median, False, leftforbidden, leftChild)
+        self.model.addConsNode(leftChild, cons)
+
+        rightChild = self.model.createChild(-self.model.getDualbound(), self.model.getLocalEstimate())
+        cons = self.conshdlr.createConsAssign("assign_{0}_{1}".format(location, median), location, median, True, rightforbidden, rightChild)
+        self.model.addConsNode(rightChild, cons)
+
+        self.nbranchings += 1
+
+        return {'result':SCIP_RESULT.SUCCESS}
+
+    #
+    # CALLBACK METHODS
+    #
+
+    """branching execution method for fractional LP solutions"""
+    def branchexeclp(self, allowadcons):
+        location, median = self.choosePair(self.computeAssignments())
+
+        if location == -1:
+            return {"result": SCIP_RESULT.DIDNOTFIND}
+        else:
+            self.performBranching(location, median)
+            return {"result": SCIP_RESULT.BRANCHED}
@@ -6,32 +6,57 @@ Created on Mon Nov  9 13:43:18 2020
 @author: Elisabeth Rodríguez-Heck, Erik Mühmer
 """
 
-from pyscipopt import Branchrule, SCIP_RESULT
+from pyscipopt import Branchrule, Eventhdlr, SCIP_RESULT, SCIP_LPSOLSTAT, SCIP_EVENTTYPE
 import numpy
 
 EPS = 1.e-10
 
+# Location selection policies:
+#   tiebreak:       a location with the most fractionally assigned medians; ties are broken by the most balanced split 
+#                   of the fractional assignment value between the two children
+#   mostfractional: the location whose largest assignment value is smallest, ties as for tiebreak
+#   pseudocost:     the location with the largest product of the estimated bound gains of the two children; the gains
+#                   are estimated per unit of forbidden assignment value from earlier branchings on the location, they
+#                   are observed when a child is solved (see EventhdlrNodeSolved)
+#   strong:         strong branching lite: for the best candidates of tiebreak, the LP value of each child is estimated 
+#                   over the present columns, optionally refined by a few subgradient steps on its Lagrangian bound;
+#                   the location with the largest product of the gains of its children is chosen. With the default 
+#                   nstrongrounds = 0, this is only the estimate of a dive LP over the columns already in the master: 
+#                   no columns are priced for the children, such that the estimate is an upper bound on their LP values
+SELECTION_POLICIES = ("tiebreak", "mostfractional", "pseudocost", "strong")
+
 class BranchruleSemiassign(Branchrule):
-    def __init__(self, pricer, conshdlr):
+    def __init__(self, pricer, conshdlr, policy = "tiebreak", nstrongcandidates = 5, nstrongrounds = 0):
         super().__init__()
         self.pricer = pricer
         self.conshdlr = conshdlr
         
+        assert policy in SELECTION_POLICIES
+        self.policy = policy
+        # strong branching lite: number of evaluated locations and of subgradient steps per child (see childEstimate)
+        self.nstrongcandidates = nstrongcandidates
+        self.nstrongrounds = nstrongrounds
+        
+        # pseudocosts: sum and number of the observed bound gains per unit of forbidden assignment value, per location
+        self.pseudocostGains = None
+        self.pseudocostCounts = None
+        # children whose gain is not observed yet: node number -> (location, LP value of the parent, forbidden value);
+        # only filled for the pseudocost policy, the gains are observed by EventhdlrNodeSolved, which must be included then
+        self.pendingChildren = {}
+        
+        # Statistics: number of branchings and of children evaluated by strong branching
+        self.nbranchings = 0
+        self.nstrongchildren = 0
+        
     #
     # Local methods
     #
     
     """ for each pair of locations, compute the (possibly fractional) assignment value
-        :param sol: solution to be checked, or NULL for LP solution
-        :param assignments: dictionary of lists of location-median assignments
+        :param sol: solution to be checked, or None for LP solution
+        :returns: matrix of location-median assignments
     """
-    def computeAssignments(self, sol, assignments):
-        nlocations = self.pricer.nlocations
-        
-        for i in range(nlocations):
-            for j in range(nlocations):
-                assignments[i][j] = 0.0
-                
+    def computeAssignments(self, sol = None):
         ########################################################################################
         # TODO: calculate the assignment value for each location-median pair.
         # i.e., assignments[i][j] should describe the (possible fractional) assignment value of
@@ -42,86 +67,156 @@ class BranchruleSemiassign(Branchrule):
         # and the median the *second*!
         ########################################################################################
         master_vars = self.pricer.patternVars
-
-        for master_var in self.pricer.patternVars:
-            median = master_var.data.median
-            locations = master_var.data.locations
-            for location in locations:
-                assignments[location][median] += self.model.getVal(master_var) # why is sol none?
         
+        # the values of all master variables are fetched at once and scattered over the assignments of their columns
+        if sol is None:
+            values = numpy.fromiter((master_var.getLPSol() for master_var in master_vars), dtype = float, count = len(master_vars))
+        else:
+            values = numpy.fromiter((self.model.getSolVal(sol, master_var) for master_var in master_vars), dtype = float, count = len(master_vars))
         
-        return {'result':SCIP_RESULT.SUCCESS}
+        return self.pricer.columnStore.assignmentMatrix(values)
     
     """for each location, sort the potential medians by nonincreasing value of fractional assignment
-       :param sortedids: for each location, the array of medians sorted by fractional assignment
-       :param assignments: dictionary of lists of location-median assignments
+       :param assignments: matrix of location-median assignments
+       :returns: matrix with the medians of every location sorted by fractional assignment, 
+                 matrix with the correspondingly sorted assignments
     """
-    def sortMedians(self, sortedids, assignments):
-        nlocations = self.pricer.nlocations
+    def sortMedians(self, assignments):
+        # argsort cannot be applied in reverse order, we reverse the rows afterwards
+        sortedids = numpy.argsort(assignments, axis = 1)[:, ::-1]
         
-        for i in range(nlocations):
-            # argsort cannot be applied in reverse order
-            sortedidstemp = numpy.argsort(assignments[i])
-            # we reverse the array afterwards
-            sortedids[i] = sortedidstemp[::-1]
-            # finally, sort also the assignments array inplace
-            assignments[i].sort(reverse = True)
+        return sortedids, numpy.take_along_axis(assignments, sortedids, axis = 1)
+    
+    """for each location, compute the number of fractionally assigned medians, the sum of all fractional assignments and
+       the sum of the fractional assignments to medians of even rank, i.e., of the medians forbidden in the right child
+       :param sortedassignments: for each location, the assignments sorted by nonincreasing value
+       :returns: arrays nfracmedians, totfrac, halffrac
+    """
+    def locationStatistics(self, sortedassignments):
+        ##########################################################################################
+        # TODO: for each location, calculate
+        #   * to how many medians it is assigned fractionally (nfracmedians)
+        #   * the sum of all fractional assignments (totfrac)
+        #   * the sum of all fractional assignments to an even median (halffrac)
+        ##########################################################################################
+        # fractional part as computed by SCIP's frac()
+        epsilon = self.model.epsilon()
+        isfractional = sortedassignments - numpy.floor(sortedassignments + epsilon) > EPS
+        fractional = numpy.where(isfractional, sortedassignments, 0.0)
         
-        return {'result':SCIP_RESULT.SUCCESS}
+        nfracmedians = numpy.count_nonzero(isfractional, axis = 1)
+        totfrac = fractional.sum(axis = 1)
+        halffrac = fractional[:, ::2].sum(axis = 1)
+        
+        return nfracmedians, totfrac, halffrac
     
-    """choose a location to branch on, or find out that the given assignments are feasible:
-     we choose a location for which the number of fractionally assigned medians is maximal;
-     in case of ties, we choose the location for which the total fractional assignment value
-     of every second median is closest to half the total fractional assignment value of all medians.
-     :param assignments: dictionary of lists of location-median assignments
+    """locations with fractional assignments, ordered by the tiebreak policy"""
+    def tiebreakOrder(self, nfracmedians, totfrac, halffrac):
+        candidates = numpy.flatnonzero(nfracmedians > 0)
+        fracdiffs = numpy.abs(halffrac - 0.5 * totfrac)[candidates]
+        
+        return candidates[numpy.lexsort((fracdiffs, -nfracmedians[candidates]))]
+    
+    """estimated gain per unit of forbidden assignment value of branching on each location"""
+    def pseudocosts(self):
+        self.initPseudocosts()
+        known = self.pseudocostCounts > 0
+        # locations without observations get the average of all observations
+        average = (self.pseudocostGains[known] / self.pseudocostCounts[known]).mean() if known.any() else 1.0
+        
+        return numpy.where(known, self.pseudocostGains / numpy.maximum(self.pseudocostCounts, 1), average)
+    
+    """Estimate the LP value of a child
+    
+       The columns incompatible with the child are fixed to zero in a dive and the LP over the remaining columns is 
+       solved. Its value is an upper bound on the LP value of the child (or target, if it is infeasible without new 
+       columns). If nstrongrounds > 0, a lower bound is computed by subgradient steps on the Lagrangian bound of the 
+       child, starting from the duals of the dive LP, and the estimate is the midpoint of both bounds.
+    
+       :param location: location to branch on
+       :param forbidden: for each median, whether the child forbids assigning the location to it
+       :param assignmentDuals: dual values of the assignment constraints at the current node
+       :param target: target value of the subgradient steps
+       :returns: estimated LP value of the child
+    """
+    def childEstimate(self, location, forbidden, assignmentDuals, target):
+        self.model.startDive()
+        for i in self.pricer.columnStore.columnsWith(location, forbidden):
+            self.model.chgVarUbDive(self.pricer.patternVars[i], 0.0)
+        lperror, cutoff = self.model.solveDiveLP()
+        upperbound = target
+        if not lperror and not cutoff and self.model.getLPSolstat() == SCIP_LPSOLSTAT.OPTIMAL:
+            upperbound = min(self.model.getLPObjVal(), target)
+            assignmentDuals, _, _ = self.pricer.fetchDuals(True)
+        self.model.endDive()
+        
+        if self.nstrongrounds == 0:
+            return upperbound
+        
+        self.pricer.forbidAssignments(location, forbidden)
+        try:
+            lowerbound = self.pricer.subgradientBound(assignmentDuals, self.nstrongrounds, target)
+        finally:
+            self.pricer.allowAssignments(location, forbidden)
+        
+        return 0.5 * (min(lowerbound, upperbound) + upperbound)
+    
+    """choose a location to branch on, or find out that the given assignments are feasible
+     :param sortedids: for each location, the medians sorted by fractional assignment
+     :param sortedassignments: for each location, the assignments sorted by nonincreasing value
      :returns: a location to branch on, or -1 in case of feasibility
     """
-    def chooseLocation(self, assignments):
-        nlocations = self.pricer.nlocations
+    def chooseLocation(self, sortedids, sortedassignments):
+        nfracmedians, totfrac, halffrac = self.locationStatistics(sortedassignments)
         
-        # variable for the location that will be returned by this method
-        location = -1
-        maxnfracmedians = 0
+        order = self.tiebreakOrder(nfracmedians, totfrac, halffrac)
+        if len(order) == 0:
+            return -1
         
+        if self.policy == "mostfractional":
+            # numpy's argmin returns the first minimum, i.e., the tiebreak order decides among equal values
+            return int(order[numpy.argmin(sortedassignments[order, 0])])
         
-        for i in range(nlocations):
-            nfracmedians = 0
-            totfrac = 0.0
-            halffrac = 0.0
+        if self.policy == "pseudocost":
+            # the left child forbids the medians of odd rank, the right child the medians of even rank
+            pseudocosts = self.pseudocosts()[order]
+            gains = numpy.maximum((totfrac - halffrac)[order] * pseudocosts, EPS) * numpy.maximum(halffrac[order] * pseudocosts, EPS)
+            return int(order[numpy.argmax(gains)])
+        
+        if self.policy == "strong" and len(order) > 1:
+            lpobjval = self.model.getLPObjVal()
+            assignmentDuals, _, _ = self.pricer.fetchDuals(True)
             
-            ##########################################################################################
-            # TODO: for each location, calculate
-            #   * to how many medians it is assigned fractionally (nfracmedians)
-            #   * the sum of all fractional assignments (totfrac)
-            #   * the sum of all fractional assignments to an even median (halffrac)
-            ##########################################################################################
-            for j in range(nlocations):
-                fractional = self.model.frac(assignments[i][j])
-                
-                if fractional > EPS:
-                    nfracmedians += 1
-                    totfrac += assignments[i][j]
-                    if (j % 2 == 0): # check if median is even
-                        halffrac += assignments[i][j]
+            # Polyak steps towards the incumbent value, or towards a slightly larger value without incumbent
+            target = self.model.getPrimalbound()
+            if self.model.isInfinity(target):
+                target = lpobjval + 0.1 * abs(lpobjval) + 1.0
             
+            bestlocation, bestgain = -1, -1.0
+            for location in order[:self.nstrongcandidates]:
+                leftforbidden, rightforbidden = self.childForbidden(sortedids[location], sortedassignments[location], location)
+                leftestimate = self.childEstimate(location, leftforbidden, assignmentDuals, target)
+                rightestimate = self.childEstimate(location, rightforbidden, assignmentDuals, target)
+                self.nstrongchildren += 2
                 
-            minfracdiff = self.model.infinity()
-            if (nfracmedians > maxnfracmedians) or (nfracmedians > 0 and nfracmedians == maxnfracmedians and self.model.isLE(abs(halffrac-0.5*totfrac),minfracdiff)):
-                location = i
-                maxnfracmedians = nfracmedians
-                minfracdiff = abs(halffrac-0.5*totfrac)
-                
-        return location
+                gain = max(leftestimate - lpobjval, EPS) * max(rightestimate - lpobjval, EPS)
+                if gain > bestgain:
+                    bestlocation, bestgain = int(location), gain
+            
+            return bestlocation
+        
+        return int(order[0])
     
 
  
  
-    """ branch on a location: create two child nodes and forbid assigning them to the medians alternately in the two nodes
+    """ medians forbidden in the two children: the medians are forbidden alternately in the order of their assignment
         :param sortedids: array of medians sorted by fractional assignment
         :param assignments: array of median assignments
         :param location: the location to branch on
+        :returns: lists leftforbidden and rightforbidden with one entry per median
     """
-    def performBranching(self, sortedids, assignments, location):
+    def childForbidden(self, sortedids, assignments, location):
         nlocations = self.pricer.nlocations
         # leftforbidden will contain the forbidden medians for the left child in tree
         leftforbidden = []
@@ -134,7 +229,7 @@ class BranchruleSemiassign(Branchrule):
         
         # loop over all potential medians
         for i in range(nlocations):
-            assert((not self.model.isFeasIntegral(assignments[sortedids[i]])) or self.model.isFeasZero(assignments[sortedids[i]]))
+            assert((not self.model.isFeasIntegral(assignments[i])) or self.model.isFeasZero(assignments[i]))
         
             # ignore already forbidden assignments, such that the child constraints only store newly forbidden assignments;
             # otherwise, this could lead to an error when deactivating a constraint
@@ -150,7 +245,16 @@ class BranchruleSemiassign(Branchrule):
                 leftforbidden[sortedids[i]] = True
             else:
                 rightforbidden[sortedids[i]] = True
-            
+        
+        return leftforbidden, rightforbidden
+    
+    """ branch on a location: create two child nodes and forbid assigning them to the medians alternately in the two nodes
+        :param sortedids: array of medians sorted by fractional assignment
+        :param assignments: array of median assignments
+        :param location: the location to branch on
+    """
+    def performBranching(self, sortedids, assignments, location):
+        leftforbidden, rightforbidden = self.childForbidden(sortedids, assignments, location)
             
         ##############################################################################################
         # TODO: create the two child nodes as well as a semiassignment constraint 
@@ -167,35 +271,77 @@ class BranchruleSemiassign(Branchrule):
         cons = self.conshdlr.createConsSemiassign("forbid_{0}_{1}".format(location, rightforbidden), location, rightforbidden, rightChild)
         self.model.addConsNode(rightChild, cons)
         
+        # the bound gains of the children are observed when they are solved (see EventhdlrNodeSolved), 
+        # only the pseudocost policy uses them
+        if self.policy == "pseudocost":
+            lpobjval = self.model.getLPObjVal()
+            self.pendingChildren[leftChild.getNumber()] = (location, lpobjval, float(assignments[1::2].sum()))
+            self.pendingChildren[rightChild.getNumber()] = (location, lpobjval, float(assignments[::2].sum()))
+        self.nbranchings += 1
+        
         return {'result':SCIP_RESULT.SUCCESS}
     
+    """ create the pseudocost arrays, if not done yet"""
+    def initPseudocosts(self):
+        if self.pseudocostGains is None:
+            self.pseudocostGains = numpy.zeros(self.pricer.nlocations)
+            self.pseudocostCounts = numpy.zeros(self.pricer.nlocations, dtype = numpy.int64)
+    
+    """ update the pseudocosts with the bound gain of a solved node, if it is a child created by this rule
+        :param node: the solved node; it may have been branched on, pruned or found infeasible
+    """
+    def updatePseudocosts(self, node):
+        child = self.pendingChildren.pop(node.getNumber(), None)
+        if child is None:
+            return
+        
+        location, parentobjval, forbiddenvalue = child
+        # the lower bound of an infeasible child is infinite, its gain is at least the gap to the incumbent
+        bound = node.getLowerbound()
+        if self.model.isInfinity(bound):
+            bound = self.model.getPrimalbound()
+        if forbiddenvalue > EPS and not self.model.isInfinity(bound):
+            self.initPseudocosts()
+            self.pseudocostGains[location] += max(bound - parentobjval, 0.0) / forbiddenvalue
+            self.pseudocostCounts[location] += 1
+    
     #
     # CALLBACK METHODS
     #
     
     """branching execution method for fractional LP solutions"""
     def branchexeclp(self, allowadcons):
-        # dictionary of lists: for each location, list of sorted medians
-        sortedids = {}
-        # double-entry dictionary, first index is location, second index is median
-        assignments = {}
-        
-        nlocations = self.pricer.nlocations
-        
-        for i in range(nlocations):
-            sortedids[i] = []
-            assignments[i] = []
-            for j in range(nlocations):
-                sortedids[i].append(j)
-                assignments[i].append(None)
-                
-        self.computeAssignments(None, assignments)
-        self.sortMedians(sortedids,assignments)
+        # matrix, first index is location, second index is median
+        assignments = self.computeAssignments(None)
+        # for each location, medians sorted by assignment and the sorted assignments
+        sortedids, sortedassignments = self.sortMedians(assignments)
         
-        location = self.chooseLocation(assignments)
+        location = self.chooseLocation(sortedids, sortedassignments)
         
         if location == -1: 
             return {"result": SCIP_RESULT.DIDNOTFIND}
         else: 
-            self.performBranching(sortedids[location], assignments[location], location)
+            self.performBranching(sortedids[location], sortedassignments[location], location)
             return{"result": SCIP_RESULT.BRANCHED}
+    
+    """solving process deinitialization method: children that are pruned without being solved are never observed"""
+    def branchexitsol(self):
+        self.pendingChildren.clear()
+
+
+# passes every solved node to the pseudocost update of the semi-assignment branching rule, such that the children that are
+# pruned or infeasible are observed as well, not only the children that are branched on
+class EventhdlrNodeSolved(Eventhdlr):
+    def __init__(self, branchrule):
+        super().__init__()
+        self.branchrule = branchrule
+
+    def eventinit(self):
+        self.model.catchEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+    def eventexit(self):
+        self.model.dropEvent(SCIP_EVENTTYPE.NODESOLVED, self)
+
+    """event execution method, called whenever the solving of a node ends"""
+    def eventexec(self, event):
+        self.branchrule.updatePseudocosts(event.getNode())
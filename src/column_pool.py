@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool of CPMP columns that are not (yet) variables of the master problem
+
+Columns are identified by their pattern signature (median, sorted tuple of locations), such that every pattern is stored
+at most once. The pool holds columns that were found in pricing but not added, e.g., because of a column limit per
+round or because pricing stopped early; at the beginning of a pricing round the pool is scanned for columns with
+negative reduced cost (resp. Farkas value) before any knapsack problem is solved.
+
+The pool is bounded: columns older than maxage scans are evicted, and if the pool holds more than maxsize columns the
+oldest ones are evicted first.
+"""
+
+import numpy
+
+EPS = 1.e-10
+
+
+"""Pattern signature of a column"""
+def column_key(median, locations):
+    return (int(median), tuple(sorted(int(location) for location in locations)))
+
+
+class ColumnPool:
+    def __init__(self, maxsize = 10000, maxage = 100):
+        assert maxsize >= 1 and maxage >= 1
+        self.maxsize = maxsize
+        self.maxage = maxage
+
+        # key -> (cost, scan in which the column entered the pool); dicts keep the insertion order, i.e., oldest first
+        self.columns = {}
+        self.nscans = 0
+
+        # flat arrays of the pool for the vectorized scan, rebuilt after the pool changed
+        self.dirty = True
+        self.keys = []
+        self.medians = None
+        self.costs = None
+        self.locations = None
+        self.columnindex = None # column of every entry of locations
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    """Add a column; a column already in the pool is kept with its age
+
+    :param key: pattern signature, see column_key
+    :param cost: objective coefficient of the column
+    """
+    def add(self, key, cost):
+        if key in self.columns:
+            return
+        self.columns[key] = (cost, self.nscans)
+        self.dirty = True
+
+        while len(self.columns) > self.maxsize:
+            del self.columns[next(iter(self.columns))]
+
+    """Remove a column, e.g., because it was added to the master"""
+    def remove(self, key):
+        if self.columns.pop(key, None) is not None:
+            self.dirty = True
+
+    def rebuild(self):
+        self.keys = list(self.columns)
+        ncolumns = len(self.keys)
+        self.medians = numpy.fromiter((median for median, _ in self.keys), dtype = numpy.int64, count = ncolumns)
+        self.costs = numpy.fromiter((cost for cost, _ in self.columns.values()), dtype = float, count = ncolumns)
+        sizes = numpy.fromiter((len(locations) for _, locations in self.keys), dtype = numpy.int64, count = ncolumns)
+        self.locations = numpy.fromiter((location for _, locations in self.keys for location in locations), dtype = numpy.int64, count = int(sizes.sum()))
+        self.columnindex = numpy.repeat(numpy.arange(ncolumns), sizes)
+        self.dirty = False
+
+    """Scan the pool for columns with negative score and remove them from the pool
+
+    :param assignmentDuals: dual values of the assignment constraints
+    :param convexityDuals: dual values of the convexity constraints
+    :param pmedianDual: dual value of the p-median constraint
+    :param forbidden: boolean matrix of forbidden assignments, first index median, second index location
+    :param redcostpricing: True for reduced costs, False for Farkas values
+    :param maxcolumns: maximal number of columns returned, None for no limit
+    :param forced: None or boolean matrix of forced assignments, first index median, second index location
+    :return: list of (key, score) of the columns with negative score, most negative first
+    """
+    def scan(self, assignmentDuals, convexityDuals, pmedianDual, forbidden, redcostpricing, maxcolumns = None, forced = None):
+        self.nscans += 1
+
+        # age based eviction, the oldest columns come first
+        for key, (_, scan) in list(self.columns.items()):
+            if self.nscans - scan <= self.maxage:
+                break
+            self.remove(key)
+
+        if not self.columns:
+            return []
+        if self.dirty:
+            self.rebuild()
+
+        ncolumns = len(self.keys)
+        scores = numpy.bincount(self.columnindex, weights = assignmentDuals[self.locations], minlength = ncolumns)
+        scores = scores - convexityDuals[self.medians] - pmedianDual
+        if redcostpricing:
+            scores += self.costs
+
+        # columns with an assignment forbidden at the current node are not feasible
+        nforbidden = numpy.bincount(self.columnindex, weights = forbidden[self.medians[self.columnindex], self.locations], minlength = ncolumns)
+
+        feasible = nforbidden == 0
+        # columns of a median with forced locations have to contain all of them
+        if forced is not None:
+            nforced = numpy.bincount(self.columnindex, weights = forced[self.medians[self.columnindex], self.locations], minlength = ncolumns)
+            feasible &= nforced == forced.sum(axis = 1)[self.medians]
+
+        improving = numpy.flatnonzero((scores < 0 - EPS) & feasible)
+        improving = improving[numpy.argsort(scores[improving], kind = "stable")]
+        if maxcolumns is not None:
+            improving = improving[:maxcolumns]
+
+        found = [(self.keys[i], float(scores[i])) for i in improving]
+        for key, _ in found:
+            self.remove(key)
+
+        return found
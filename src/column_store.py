@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array-backed store of the columns of the CPMP master problem
+
+Every column gets an index and a boolean membership row over the locations, together with its median. Membership tests
+are O(1) and questions about all columns, e.g., "which columns contain location l and use median m", are answered with
+vectorized operations. The arrays grow by doubling.
+
+In addition, the store keeps an inverted index from every location to the columns containing it, bucketed by median.
+Branching decisions are propagated with the index, such that the work is proportional to the columns they affect and
+not to the number of columns of the master.
+"""
+
+from bisect import bisect_left
+
+import numpy
+
+
+class ColumnStore:
+    def __init__(self, nlocations, initialsize = 1024):
+        self.nlocations = nlocations
+        self.ncolumns = 0
+
+        # membership[k, l]: does column k contain location l?
+        self.membership = numpy.zeros((max(1, initialsize), nlocations), dtype = bool)
+        # medians[k]: median of column k
+        self.medians = numpy.zeros(max(1, initialsize), dtype = numpy.int64)
+
+        # locationcolumns[l][m]: ascending list of the indices of the columns of median m containing location l
+        self.locationcolumns = [{} for _ in range(nlocations)]
+        # mediancolumns[m]: ascending list of the indices of the columns of median m
+        self.mediancolumns = [[] for _ in range(nlocations)]
+
+    def __len__(self):
+        return self.ncolumns
+
+    """Add a column
+
+    :param median: median of the column
+    :param locations: locations of the column
+    :return: index of the column
+    """
+    def add(self, median, locations):
+        if self.ncolumns == len(self.medians):
+            size = 2 * len(self.medians)
+            membership = numpy.zeros((size, self.nlocations), dtype = bool)
+            membership[:self.ncolumns] = self.membership
+            medians = numpy.zeros(size, dtype = numpy.int64)
+            medians[:self.ncolumns] = self.medians
+            self.membership, self.medians = membership, medians
+
+        index = self.ncolumns
+        self.membership[index, locations] = True
+        self.medians[index] = median
+        self.ncolumns += 1
+
+        for location in locations:
+            self.locationcolumns[location].setdefault(median, []).append(index)
+        self.mediancolumns[median].append(index)
+
+        return index
+
+    """Does a column contain a location?"""
+    def contains(self, index, location):
+        return bool(self.membership[index, location])
+
+    """Columns containing a location
+
+    :param location: location
+    :param medians: None for all medians, a median, or a boolean mask over the medians
+    :param start: only columns with index at least start are considered
+    :return: array of column indices
+    """
+    def columnsWith(self, location, medians = None, start = 0):
+        selected = self.membership[start:self.ncolumns, location]
+        if medians is not None:
+            columnmedians = self.medians[start:self.ncolumns]
+            if numpy.ndim(medians) == 0:
+                selected = selected & (columnmedians == medians)
+            else:
+                selected = selected & numpy.asarray(medians, dtype = bool)[columnmedians]
+
+        return numpy.flatnonzero(selected) + start
+
+    """Columns containing a location and using one of the given medians, found with the inverted index
+
+    :param location: location
+    :param medians: array of median indices
+    :param start: only columns with index at least start are considered
+    :return: list of column indices
+    """
+    def indexedColumnsWith(self, location, medians, start = 0):
+        buckets = self.locationcolumns[location]
+        columns = []
+        for median in medians:
+            bucket = buckets.get(median)
+            if bucket is not None:
+                columns.extend(bucket[bisect_left(bucket, start):])
+
+        return columns
+
+    """Columns of a median not containing a location, found with the index of the columns of the median
+
+    :param location: location
+    :param median: median
+    :param start: only columns with index at least start are considered
+    :return: list of column indices
+    """
+    def indexedColumnsWithout(self, location, median, start = 0):
+        bucket = self.mediancolumns[median]
+        columns = numpy.asarray(bucket[bisect_left(bucket, start):], dtype = numpy.int64)
+
+        return columns[~self.membership[columns, location]].tolist()
+
+    """Aggregate values of the columns per assignment
+
+    :param values: array with one value per column, e.g., the LP solution
+    :return: matrix, first index location, second index median: sum of the values of the columns assigning the location to the median
+    """
+    def assignmentMatrix(self, values):
+        values = numpy.asarray(values, dtype = float)
+        assert len(values) == self.ncolumns
+
+        columns, locations = numpy.nonzero(self.membership[:self.ncolumns])
+        flat = locations * self.nlocations + self.medians[columns]
+        matrix = numpy.bincount(flat, weights = values[columns], minlength = self.nlocations * self.nlocations)
+
+        return matrix.reshape(self.nlocations, self.nlocations)
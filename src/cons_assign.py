@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Constraint handler for pair branching decisions in capacitated p-median problems
+
+An assign constraint fixes the assignment of a location to a median in the compact formulation: either the location
+is not assigned to the median (x_lm = 0), or it is assigned to it (x_lm = 1). In the latter case, the location may not
+be assigned to any other median and every column of the median has to contain the location.
+"""
+
+from pyscipopt import Conshdlr, SCIP_RESULT
+from pyscipopt.scip import Node
+
+from dataclasses import dataclass
+from typing import List
+
+import numpy
+
+#
+# Data structures
+#
+
+# Constraint data for assign constraints
+@dataclass
+class ConsData:
+    location: int            # location of the branching decision
+    median: int              # median of the branching decision
+    assign: bool             # is the location assigned to the median (x_lm = 1) or not (x_lm = 0)?
+    forbidden: List[bool]    # for each median, the information whether the location may not be assigned to it;
+                             # only the assignments newly forbidden by this constraint
+    node: Node = None        # node for which the constraint is valid
+    propagate: bool = True   # should the constraint be propagated? TRUE if the subtree below the node is entered
+                             # and new variables have been created since the last propagation
+    npropvars: int = 0       # number of variables present in the problem the last time the constraint was propagated
+    medians: numpy.ndarray = None # indices of the forbidden medians, to update the pricer in time proportional to their number
+
+
+class ConshdlrAssign(Conshdlr):
+    def __init__(self, pricer):
+        super().__init__()
+        self.pricer = pricer
+
+
+    #
+    # Callback methods
+    #
+
+    """Domain propagation method of constraint handler
+
+    Fixes to zero those variables whose represented clusters assign the location to a forbidden median and,
+    if the location is assigned to the median, the clusters of the median that do not contain the location
+    """
+    def consprop(self, constraints, nusefulconss, nmarkedconss, proptiming):
+        result = SCIP_RESULT.DIDNOTFIND
+        for c in constraints:
+            if result == SCIP_RESULT.CUTOFF:
+                break
+            assert c.isActive()
+
+            if c.data.propagate:
+                columnStore = self.pricer.columnStore
+                incompatible = columnStore.indexedColumnsWith(c.data.location, c.data.medians, c.data.npropvars)
+                if c.data.assign:
+                    incompatible += columnStore.indexedColumnsWithout(c.data.location, c.data.median, c.data.npropvars)
+
+                for i in incompatible:
+                    var = self.pricer.patternVars[i]
+                    if not self.model.isFeasZero(var.getUbLocal()):
+                        infeasible, fixed = self.model.fixVar(var, 0.0)
+
+                        if infeasible:
+                            result = SCIP_RESULT.CUTOFF
+                            break
+                        else:
+                            result = SCIP_RESULT.REDUCEDDOM
+                            assert(fixed)
+
+                c.data.propagate = False
+                c.data.npropvars = self.pricer.nvars
+
+        return {'result': result}
+
+    """constraint activation notification method of constraint handler"""
+    def consactive(self, constraint):
+        assert(constraint.data.npropvars <= self.pricer.nvars)
+
+        # notify SCIP that the branching decision has to be propagated to the newly created master variables
+        if constraint.data.npropvars < self.pricer.nvars:
+            constraint.data.propagate = True
+            self.model.repropagateNode(constraint.data.node)
+
+        # notify the pricer about the forbidden and forced assignments
+        self.pricer.forbidAssignments(constraint.data.location, constraint.data.medians)
+        if constraint.data.assign:
+            self.pricer.forceAssignment(constraint.data.median, constraint.data.location)
+
+        return {'result':SCIP_RESULT.SUCCESS}
+
+    """constraint deactivation notification method of constraint handler"""
+    def consdeactive(self, constraint):
+        self.pricer.allowAssignments(constraint.data.location, constraint.data.medians)
+        if constraint.data.assign:
+            self.pricer.releaseAssignment(constraint.data.median, constraint.data.location)
+        constraint.data.propagate = False
+
+        return {'result':SCIP_RESULT.SUCCESS}
+
+    """Constraint display method of constraint handler"""
+    def consprint(self, constraint):
+        print("Assign Constraint:")
+        print("   Location "+str(constraint.data.location)+(" assigned to " if constraint.data.assign else " not assigned to ")+
+              "median "+str(constraint.data.median))
+        print("\n")
+
+        return {'result':SCIP_RESULT.SUCCESS}
+
+    def conscheck(self, constraints, solution, checkintegrality, checklprows, printreason, completely):
+        return {"result": SCIP_RESULT.FEASIBLE}
+
+
+    #
+    # Constraint specific interface methods
+    #
+
+    """Creates an assign constraint
+
+    :param name: name of constraint
+    :param location: location of the branching decision
+    :param median: median of the branching decision
+    :param assign: True if the location is assigned to the median, False if it may not be assigned to it
+    :param forbidden: for each median, whether the constraint newly forbids assigning the location to it
+    :param node: node for which the constraint is valid
+    :return: returns the newly created constraint
+    """
+    def createConsAssign(self, name, location, median, assign, forbidden, node):
+        cons = self.model.createCons(self, name, initial = False, separate = False, enforce = True, check = True, propagate = True, local = True, modifiable = False, dynamic = False, removable = False, stickingatnode = True)
+        cons.data = ConsData(location, median, assign, forbidden, node, medians = numpy.flatnonzero(forbidden))
+        return cons
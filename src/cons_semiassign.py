@@ -12,6 +12,8 @@ from pyscipopt.scip import Node
 from dataclasses import dataclass
 from typing import List
 
+import numpy
+
 ##### There are no TODOs in this file #####
 
 #
@@ -27,6 +29,7 @@ class ConsData:
     propagate: bool = True   # should the constraint be propagated? TRUE if the subtree below the node is entered 
                              # and new variables have been created since the last propagation
     npropvars: int = 0       # number of variables present in the problem the last time the constraint was propagated
+    medians: numpy.ndarray = None # indices of the forbidden medians, to update the pricer in time proportional to their number
   
 
 class ConshdlrSemiassign(Conshdlr):
@@ -57,11 +60,10 @@ class ConshdlrSemiassign(Conshdlr):
                 assert c.isActive()
             
                 if c.data.propagate:
-                    i = c.data.npropvars - 1
-                    for i in range(c.data.npropvars, self.pricer.nvars):
+                    # columns created since the last propagation that assign the location to a forbidden median
+                    for i in self.pricer.columnStore.indexedColumnsWith(c.data.location, c.data.medians, c.data.npropvars):
                         var = self.pricer.patternVars[i]
-                        median = var.data.median
-                        if not self.model.isFeasZero(var.getUbLocal()) and c.data.forbidden[median] and self.pricer.isLocationInCluster(var, c.data.location):
+                        if not self.model.isFeasZero(var.getUbLocal()):
                             infeasible, fixed = self.model.fixVar(var, 0.0)
 
                             if infeasible:
@@ -72,7 +74,7 @@ class ConshdlrSemiassign(Conshdlr):
                                 assert(fixed)
                             
                     c.data.propagate = False
-                    c.data.npropvars = i + 1
+                    c.data.npropvars = self.pricer.nvars
              
         return {'result': result}
 
@@ -86,13 +88,13 @@ class ConshdlrSemiassign(Conshdlr):
             self.model.repropagateNode(constraint.data.node)
         
         # notify the pricer about the forbidden assignments
-        self.pricer.forbidAssignments(constraint.data.location, constraint.data.forbidden)
+        self.pricer.forbidAssignments(constraint.data.location, constraint.data.medians)
         
         return {'result':SCIP_RESULT.SUCCESS}
  
     """constraint deactivation notification method of constraint handler"""
     def consdeactive(self, constraint):
-        self.pricer.allowAssignments(constraint.data.location, constraint.data.forbidden)
+        self.pricer.allowAssignments(constraint.data.location, constraint.data.medians)
         constraint.data.propagate = False
         
         return {'result':SCIP_RESULT.SUCCESS}
@@ -130,5 +132,5 @@ class ConshdlrSemiassign(Conshdlr):
     """
     def createConsSemiassign(self, name, location, forbidden, node):
         cons = self.model.createCons(self, name, initial = False, separate = False, enforce = True, check = True, propagate = True, local = True, modifiable = False, dynamic = False, removable = False, stickingatnode = True)
-        cons.data = ConsData(location, forbidden, node)
+        cons.data = ConsData(location, forbidden, node, medians = numpy.flatnonzero(forbidden))
         return cons
\ No newline at end of file
@@ -6,57 +6,143 @@ Created on Mon Oct 26 17:01:57 2020
 @author: Elisabeth Rodríguez-Heck, Erik Mühmer
 """
 
-from pyscipopt import Model, quicksum, SCIP_PARAMSETTING
+from pyscipopt import Model, quicksum, SCIP_PARAMSETTING, SCIP_HEURTIMING
+import numpy
+
+import heur_localsearch
+import preprocess_cpmp
 import reader_cpmp
 
 
-nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance('../instances/p550/p550-03.cpmp')
+""" Build the compact formulation of a CPMP instance
+
+The assignment variables are created for the allowed pairs only, the rows are built from index arrays of these pairs.
+:param nlocations: number of locations
+:param nclusters: number of medians
+:param distances: distance matrix (array, view or dictionary), first index location, second index median
+:param demands: demands (array, view or dictionary)
+:param capacities: capacities (array, view or dictionary)
+:param solveinteger: if True, the variables are binary, otherwise continuous (LP relaxation)
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location; None if all are allowed
+:param maxsizes: for each median the maximal number of locations of its cluster (see preprocess_cpmp), None for no bound
+:param knearest: if not None, a location can only be assigned to its knearest closest medians
+:param strengthen: if True, the constraints x[i,j] <= y[j] are added
+:param names: if True, the variables are named x(i,j) and y(j), e.g. for writing the problem
+:return: model, dictionary of the assignment variables with key (location, median), dictionary of the median variables,
+         list of the assignment constraints (one per location)
+"""
+def build_compact(nlocations, nclusters, distances, demands, capacities, solveinteger = True, forbidden = None, maxsizes = None,
+                  knearest = None, strengthen = False, names = False):
+    distances = reader_cpmp.as_array(distances, (nlocations, nlocations))
+    demands = reader_cpmp.as_array(demands, nlocations)
+    capacities = reader_cpmp.as_array(capacities, nlocations)
+    vtype = 'B' if solveinteger else 'C'
 
-model_compact = Model()
+    # allowed assignments, first index location, second index median
+    allowed = numpy.ones((nlocations, nlocations), dtype = bool) if forbidden is None else ~forbidden.T
+    if knearest is not None:
+        nearest = numpy.zeros((nlocations, nlocations), dtype = bool)
+        numpy.put_along_axis(nearest, reader_cpmp.knearest_medians(distances, knearest), True, axis = 1)
+        allowed &= nearest
 
-# By default, SCIPs output is printed in the std output, not visible here. To have visible output:
-model_compact.redirectOutput()
-# Print SCIP version
-model_compact.printVersion()
+    # pairs sorted by location; bylocation[i] (resp. bymedian[j]) are the indices of the pairs of location i (resp. median j)
+    locations, medians = numpy.nonzero(allowed)
+    bylocation = numpy.split(numpy.arange(len(locations)), numpy.cumsum(allowed.sum(axis = 1))[:-1])
+    bymedian = numpy.split(numpy.argsort(medians, kind = "stable"), numpy.cumsum(allowed.sum(axis = 0))[:-1])
+    costs = distances[locations, medians].astype(float)
 
-# Set solver parameters
-model_compact.setPresolve(SCIP_PARAMSETTING.OFF)    
-model_compact.setIntParam("presolving/maxrestarts", 0)    
-model_compact.setSeparating(SCIP_PARAMSETTING.OFF)
+    model_compact = Model()
 
-model_compact.setMinimize()
+    # Set solver parameters
+    model_compact.setPresolve(SCIP_PARAMSETTING.OFF)
+    model_compact.setIntParam("presolving/maxrestarts", 0)
+    model_compact.setSeparating(SCIP_PARAMSETTING.OFF)
 
-##################################################################################
-# TODO: Create the variables, constraints and objective function for 
-# model_compact and optimize it
-##################################################################################
+    model_compact.setMinimize()
 
-# Initizalization of the variables
-x = {}
-y = {}
+    ##################################################################################
+    # TODO: Create the variables, constraints and objective function for
+    # model_compact and optimize it
+    ##################################################################################
 
+    # Create the variables, the objective function (minimize total distances) is given by their coefficients
+    # y[j] = 1 iff j-th location is median, 0 otherwise
+    # x[i,j] = 1 iff location i is assigned to location j, 0 otherwise (only for the allowed assignments)
+    y = numpy.array([model_compact.addVar(vtype = vtype, ub = 1.0, name = "y(%s)"%(j) if names else "") for j in range(nlocations)])
+    xvars = numpy.array([model_compact.addVar(vtype = vtype, ub = 1.0, obj = cost, name = "x(%s,%s)"%(i, j) if names else "")
+                         for i, j, cost in zip(locations.tolist(), medians.tolist(), costs.tolist())])
 
+    # Create the assignment constraints: a location is assigned to exactly one location/median
+    assignmentConss = [model_compact.addCons(quicksum(xvars[bylocation[i]]) == 1) for i in range(nlocations)]
 
-# Create the variables
-for i in range(nlocations):
-    y[i] = model_compact.addVar(vtype = 'B', name="y(%s)"%(i)) # y[i] = 1 iff i-th location is median, 0 otherwise
+    # Create the capacity constraints: demands of assigned locations does not exceed capacity of median
+    #                                  coupling of assignment and median variable
+    # (the rows are built from the coefficient arrays of the pairs of a median)
+    weights = demands[locations].astype(float)
     for j in range(nlocations):
-        x[i,j] = model_compact.addVar(vtype = 'B', name="x(%s,%s)"%(i,j)) # x[i,j] = 1 iff location i is assigned to location j, 0 otherwise
-    
-# Create the objective function: minimize total distances
-model_compact.setObjective(quicksum(distances[i,j] * x[i,j] for i in range(nlocations) for j in range(nlocations)), "minimize")
-
-# Create the assignment constraints: a location is assigned to at most one location/median
-for i in range(nlocations):
-    model_compact.addCons(quicksum(x[i,j] for j in range(nlocations)) == 1)
-    
-# Create the capacity constraints: demands of assigned locations does not exceed capacity of median
-#                                  coupling of assignment and median variable
-for j in range(nlocations):
-    model_compact.addCons(quicksum(demands[i] * x[i,j] for i in range(nlocations)) <= capacities[j]*y[j])
-    
-# Create the p-median constraint: nclusters are needed
-model_compact.addCons(quicksum(y[j] for j in range(nlocations)) == nclusters)
-
-# optimize
-model_compact.optimize()
+        model_compact.addCons(quicksum(weights[bymedian[j]] * xvars[bymedian[j]]) <= float(capacities[j])*y[j])
+
+    # Create the cluster size constraints: a median serves at most as many locations as the smallest demands fit into its capacity
+    if maxsizes is not None:
+        for j in range(nlocations):
+            model_compact.addCons(quicksum(xvars[bymedian[j]]) <= int(maxsizes[j])*y[j])
+
+    # Create the strengthening constraints: a location can only be assigned to an open median
+    if strengthen:
+        for xvar, yvar in zip(xvars, y[medians]):
+            model_compact.addCons(xvar <= yvar)
+
+    # Create the p-median constraint: nclusters are needed
+    model_compact.addCons(quicksum(y) == nclusters)
+
+    x = dict(zip(zip(locations.tolist(), medians.tolist()), xvars))
+    return model_compact, x, dict(enumerate(y)), assignmentConss
+
+
+if __name__ == '__main__':
+    nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance_arrays('../instances/p550/p550-03.cpmp')
+
+    # If preprocessing is True, the assignment variables that cannot be part of a solution better than the best heuristic
+    # solution are not created and the cluster sizes are bounded (see preprocess_cpmp); the heuristic solution is passed to SCIP
+    preprocessing = False
+
+    # If knearest is not None, a location can only be assigned to its knearest closest medians (a heuristic restriction);
+    # if strengthen is True, the constraints x[i,j] <= y[j] are added
+    knearest = None
+    strengthen = False
+
+    # If localsearch is True, every new incumbent is improved by local search (see localsearch_cpmp)
+    localsearch = False
+
+    reductions = None
+    if preprocessing:
+        reductions = preprocess_cpmp.preprocess(distances, demands, capacities, nclusters)
+        print("Preprocessing: %d assignments forbidden, %d medians closed" % (reductions.nforbidden(), reductions.nclosed()))
+
+    model_compact, x, y, _ = build_compact(nlocations, nclusters, distances, demands, capacities,
+                                        forbidden = reductions.forbidden if reductions is not None else None,
+                                        maxsizes = reductions.maxsizes if reductions is not None else None,
+                                        knearest = knearest, strengthen = strengthen)
+
+    # By default, SCIPs output is printed in the std output, not visible here. To have visible output:
+    model_compact.redirectOutput()
+    # Print SCIP version
+    model_compact.printVersion()
+
+    # the preprocessing only keeps solutions that are better than the heuristic solution, which is the incumbent
+    # (with knearest, the incumbent may use an assignment without variable)
+    if reductions is not None and reductions.incumbent is not None and all((i,j) in x for j, locations in reductions.incumbent.clusters for i in locations):
+        sol = model_compact.createSol()
+        for j, locations in reductions.incumbent.clusters:
+            model_compact.setSolVal(sol, y[j], 1.0)
+            for i in locations:
+                model_compact.setSolVal(sol, x[i,j], 1.0)
+        model_compact.addSol(sol)
+
+    if localsearch:
+        localsearchheur = heur_localsearch.HeurLocalSearchCompact(distances, demands, capacities, x, y)
+        model_compact.includeHeur(localsearchheur, "LocalSearch", "local search on the incumbent", "L", priority = -10000,
+                                  freq = 1, timingmask = SCIP_HEURTIMING.AFTERLPNODE | SCIP_HEURTIMING.AFTERPSEUDONODE)
+
+    # optimize
+    model_compact.optimize()
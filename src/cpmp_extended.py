@@ -7,19 +7,40 @@ Created on Mon Oct 26 17:39:18 2020
 """
 
 
-from pyscipopt import Model, SCIP_PARAMSETTING, scip
+from pyscipopt import Model, SCIP_PARAMSETTING, SCIP_HEURTIMING, scip
 from pyscipopt.scip import quicksum
 
+import numpy
+
 import reader_cpmp
 import branch_semiassign
 import cons_semiassign
+import branch_assign
+import cons_assign
 import pricer_cpmp
+import heuristic_cpmp
+import column_store
+import sparse_assignments
+import preprocess_cpmp
+import heur_restrictedmaster
+import heur_localsearch
+import hybrid_cpmp
 
 EPS = 1.e-10
 
 
     
-def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveinteger, semiassignmentbranching, use_mip):
+def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveinteger, semiassignmentbranching, use_mip, candidates = None, parallel = None, strategy = "full", maxcolumns = None,
+              stabilization = None, smoothing = 0.5, boxwidth = 0.5, startcolumns = False, columnpool = False, branchingpolicy = "tiebreak",
+              pairbranching = False, nodewarmstart = False, preprocessing = False, 
+              rootfixing = False, heuristic = None, heuristicfreq = 10, 
+              localsearch = False, hybrid = None, hybridtimelimit = 10.0, timelimit = None, memorylimit = None, 
+              nstrongcandidates = 5, nstrongrounds = 0, nworkers = None):
+    # In streaming mode, the distances are only read per median (see reader_cpmp.StreamingInstance): the heuristics
+    # and reductions that need the whole distance matrix are not available
+    streaming = isinstance(distances, numpy.memmap)
+    assert not streaming or not (startcolumns or preprocessing or rootfixing or hybrid is not None)
+    
     # Create solver instance
     master = Model("CPMP")
     
@@ -32,19 +53,53 @@ def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveintege
     master.setPresolve(SCIP_PARAMSETTING.OFF)
     master.setIntParam("presolving/maxrestarts", 0)
     master.setSeparating(SCIP_PARAMSETTING.OFF)
+    
+    # time limit in seconds and memory limit in MB, e.g., for batch runs (see batch_cpmp)
+    if timelimit is not None:
+        master.setParam("limits/time", timelimit)
+    if memorylimit is not None:
+        master.setParam("limits/memory", memorylimit)
 
     
     master.setMinimize()
     
+    # the distances are integral, hence so is the objective value of every solution; 
+    # SCIP cannot detect this itself since the variables are priced
+    if solveinteger:
+        master.setObjIntegral()
+    
     # Creating a pricer
-    pricer = pricer_cpmp.PricerCPMP(solveinteger, use_mip)
+    pricer = pricer_cpmp.PricerCPMP(solveinteger, use_mip, parallel, nworkers, strategy = strategy, maxcolumns = maxcolumns,
+                                    stabilization = stabilization, smoothing = smoothing, boxwidth = boxwidth, 
+                                    columnpool = columnpool, nodewarmstart = nodewarmstart, rootfixing = rootfixing)
     master.includePricer(pricer, "PricerCPMP", "Pricer to identify new CPMP assignment patterns")
     
-    if solveinteger and semiassignmentbranching:
+    branchrule = None
+    if solveinteger and pairbranching:
+        conshdlr = cons_assign.ConshdlrAssign(pricer)
+        master.includeConshdlr(conshdlr, name = "assign", desc = "constraint handler for pair branching decisions in capacitated p-median problems", enfopriority = 0, chckpriority=0, propfreq = 1, eagerfreq = 100, needscons = True, delayprop = False, proptiming = scip.PY_SCIP_PROPTIMING.BEFORELP)
+        branchrule = branch_assign.BranchruleAssign(pricer, conshdlr)
+        master.includeBranchrule(branchrule, name = "Assign", desc = "pair branching rule", priority=50000, maxdepth = -1, maxbounddist = 1)
+    elif solveinteger and semiassignmentbranching:
         conshdlr = cons_semiassign.ConshdlrSemiassign(pricer)
         master.includeConshdlr(conshdlr, name = "semiassign", desc = "constraint handler for branching decisions in capacitated p-median problems", enfopriority = 0, chckpriority=0, propfreq = 1, eagerfreq = 100, needscons = True, delayprop = False, proptiming = scip.PY_SCIP_PROPTIMING.BEFORELP)
-        branchrule = branch_semiassign.BranchruleSemiassign(pricer,conshdlr)
+        branchrule = branch_semiassign.BranchruleSemiassign(pricer, conshdlr, branchingpolicy, nstrongcandidates, nstrongrounds)
         master.includeBranchrule(branchrule, name = "Semiassign", desc = "semi assignment branching rule", priority=50000, maxdepth = -1, maxbounddist = 1)
+        if branchingpolicy == "pseudocost":
+            master.includeEventhdlr(branch_semiassign.EventhdlrNodeSolved(branchrule), "NodeSolved", "pseudocost update of semi assignment branching")
+
+    
+    heur = None
+    if heuristic is not None:
+        heur = heur_restrictedmaster.HeurRestrictedMaster(pricer, heuristic)
+        master.includeHeur(heur, "RestrictedMaster", "primal heuristic on the columns of the master", "R", priority = 10000, 
+                           freq = heuristicfreq, timingmask = SCIP_HEURTIMING.AFTERLPNODE)
+    
+    localsearchheur = None
+    if localsearch:
+        localsearchheur = heur_localsearch.HeurLocalSearchMaster(pricer)
+        master.includeHeur(localsearchheur, "LocalSearch", "local search on the incumbent", "L", priority = -10000, 
+                           freq = 1, timingmask = SCIP_HEURTIMING.AFTERLPNODE | SCIP_HEURTIMING.AFTERPSEUDONODE)
 
 
     # Initialize containers for the master constraints
@@ -80,7 +135,7 @@ def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveintege
     # Prepare the pricer data
     #
 
-    # List of PatternVarData with pattern variables. We can access the extreme points by .median: int, .locations: List[int]
+    # List of pattern variables with PatternVarData. We can access the extreme points by .median: int, .locations: array of int
     patternVars = []
     # Dictionary of counters, for each median we count how many variables we have generated. 
     nVarsMedian = {}
@@ -88,16 +143,19 @@ def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveintege
         nVarsMedian[median] = 0
     
     
-    # Input data
+    # Input data, the pricer works on numpy arrays
     pricer.nlocations = nlocations
     pricer.nclusters = nclusters
-    pricer.distances = distances
-    pricer.demands = demands
-    pricer.capacities = capacities
+    pricer.distances = reader_cpmp.as_array(distances, (nlocations, nlocations))
+    pricer.demands = reader_cpmp.as_array(demands, nlocations)
+    pricer.capacities = reader_cpmp.as_array(capacities, nlocations)
+    # Candidate locations per median, None if all assignments are plausible
+    pricer.candidates = candidates
     
     # Master Variables
     pricer.patternVars = patternVars
     pricer.nVarsMedian = nVarsMedian
+    pricer.columnStore = column_store.ColumnStore(nlocations)
     
     # Master Constraints
     pricer.assignmentConss = assignmentConss
@@ -111,20 +169,143 @@ def test_cpmp(nlocations, nclusters, distances, demands, capacities, solveintege
     # In this problem we also have to create the forbiddenassignments matrix, in order to communicate 
     # to the pricer which assignments cannot take place due to branching decisions
     
-    # IMPORTANT: In this dictionary, first index is always the median, second index the location
-    forbiddenassignments = {}
+    # IMPORTANT: In this boolean matrix, first index is always the median, second index the location
     # Initialize it to false everywehere: initially every assignment is possible
-    for median in range(nlocations):
-        for location in range(nlocations):
-            forbiddenassignments[median,location] = False
+    # In streaming mode, the matrices only store their nonzero entries, see sparse_assignments
+    if streaming:
+        forbiddenassignments = sparse_assignments.SparseAssignments(nlocations, nlocations)
+    else:
+        forbiddenassignments = numpy.zeros((nlocations, nlocations), dtype = bool)
     pricer.forbiddenassignments = forbiddenassignments
+    # The branching decisions are nested: every assignment counts how often it is forbidden (same indices)
+    # Pair branching also forces assignments: every column of the median has to contain the location
+    if streaming:
+        pricer.forbiddencounts = sparse_assignments.SparseAssignments(nlocations, nlocations, numpy.int16)
+        pricer.globalforbidden = sparse_assignments.SparseAssignments(nlocations, nlocations)
+        pricer.forcedassignments = sparse_assignments.SparseAssignments(nlocations, nlocations)
+    else:
+        pricer.forbiddencounts = numpy.zeros((nlocations, nlocations), dtype = numpy.int16)
+        pricer.globalforbidden = numpy.zeros((nlocations, nlocations), dtype = bool)
+        pricer.forcedassignments = numpy.zeros((nlocations, nlocations), dtype = bool)
+    
+    solutions = []
+    if startcolumns or preprocessing:
+        solutions = heuristic_cpmp.construct_solutions(pricer.distances, pricer.demands, pricer.capacities, nclusters)
     
-    master.optimize()
+    # The reductions forbid assignments that are not part of any solution better than the best heuristic solution;
+    # the heuristic solution itself is kept, it is always added to the master and passed to SCIP
+    if preprocessing:
+        reductions = preprocess_cpmp.preprocess(pricer.distances, pricer.demands, pricer.capacities, nclusters, 
+                                                solutions[0] if solutions else None, integral = solveinteger)
+        for location in range(nlocations):
+            pricer.forbidAssignmentsGlobally(location, reductions.forbidden[:, location])
+        print("Preprocessing      : %d assignments forbidden, %d medians closed" % (reductions.nforbidden(), reductions.nclosed()))
+        if not startcolumns:
+            solutions = solutions[:1]
+    
+    # The compact formulation gives start columns, the duals of the first pricing round and possibly an incumbent
+    if hybrid is not None:
+        start = hybrid_cpmp.compact_start(nlocations, nclusters, pricer.distances, pricer.demands, pricer.capacities, 
+                                          pricer.globalforbidden, hybrid, hybridtimelimit)
+        if start.duals is not None:
+            pricer.setInitialDuals(start.duals)
+        pricer.addSolution(start.columns, pricedVar = False)
+        if start.solution is not None and (not solutions or start.solution.cost < solutions[0].cost):
+            solutions.insert(0, start.solution)
+        print("Hybrid start       : compact LP bound %.2f, %d start columns" % (start.bound, len(start.columns)))
+    
+    # Seed the master with the columns of heuristic solutions, such that the first LP is feasible;
+    # the best solution is passed to SCIP as incumbent
+    if solutions:
+        for solution in solutions:
+            pricer.addSolution(solution.clusters, pricedVar = False)
+        
+        sol = master.createSol()
+        for var in pricer.addSolution(solutions[0].clusters, pricedVar = False):
+            master.setSolVal(sol, var, 1.0)
+        master.addSol(sol)
+    
+    try:
+        master.optimize()
+    finally:
+        # the parallel pricing workers and their shared memory are also released if the solve is aborted
+        if pricer.parallelPricing is not None:
+            pricer.parallelPricing.close()
     #master.writeLP(filename="test.lp")
     
+    print("Pricing rounds     : %d (%d mispricings)" % (pricer.npricingrounds, pricer.nmisprices))
+    print("Pricing time (sec) : %.2f" % pricer.pricingtime)
+    print("Column pool        : %d columns reused (%d duplicates rejected)" % (pricer.npoolcolumns, pricer.nduplicates))
+    print("Node warm start    : %d columns" % pricer.nwarmstartcolumns)
+    print("Root fixing        : %d columns, %d assignments" % (pricer.nfixedcolumns, pricer.nfixedassignments))
+    if hybrid is not None:
+        print("Initial duals      : %d columns" % pricer.ninitialcolumns)
+    if heur is not None:
+        print("Master heuristic   : %d calls, %d solutions" % (heur.ncalls, heur.nsolutions))
+    if localsearchheur is not None:
+        print("Local search       : %d calls, %d solutions" % (localsearchheur.ncalls, localsearchheur.nsolutions))
+    
+    # statistics to compare settings, e.g., branching policies
+    return {'status': master.getStatus(), 
+            'primalbound': master.getPrimalbound(), 
+            'dualbound': master.getDualbound(), 
+            'nnodes': master.getNNodes(), 
+            'time': master.getSolvingTime(), 
+            'npricingrounds': pricer.npricingrounds, 
+            'pricingtime': pricer.pricingtime, 
+            'nvars': pricer.nvars, 
+            'nbranchings': branchrule.nbranchings if branchrule is not None else 0, 
+            'nstrongchildren': getattr(branchrule, "nstrongchildren", 0)}
+
+"""Solve instances with every branching policy and print the tree sizes and solving times
+
+:param filenames: instance files
+:param policies: location selection policies, see branch_semiassign.SELECTION_POLICIES
+:param pairbranching: if True, the instances are also solved with pair branching (policy 'pair')
+:param nstrongcandidates: number of candidate locations of the policy 'strong'
+:param nstrongrounds: number of subgradient steps per strong branching child, 0 for the dive estimate only
+:param options: further keyword arguments of test_cpmp
+:return: list of (filename, policy, statistics of test_cpmp)
+"""
+def benchmark_branching(filenames, policies = branch_semiassign.SELECTION_POLICIES, pairbranching = False, nstrongcandidates = 5, 
+                        nstrongrounds = 0, **options):
+    results = []
+    for filename in filenames:
+        nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance(filename)
+        for policy in policies:
+            stats = test_cpmp(nlocations, nclusters, distances, demands, capacities, True, True, False, branchingpolicy = policy, 
+                              nstrongcandidates = nstrongcandidates, nstrongrounds = nstrongrounds, **options)
+            results.append((filename, policy, stats))
+        if pairbranching:
+            stats = test_cpmp(nlocations, nclusters, distances, demands, capacities, True, False, False, pairbranching = True, **options)
+            results.append((filename, "pair", stats))
+    
+    print("%-30s %-15s %10s %10s %8s %10s" % ("instance", "policy", "primal", "dual", "nodes", "time"))
+    for filename, policy, stats in results:
+        print("%-30s %-15s %10.2f %10.2f %8d %10.2f" % (filename, policy, stats['primalbound'], stats['dualbound'], stats['nnodes'], stats['time']))
+    
+    return results
+    
 if __name__ == '__main__':
     # Change the name of the instance to test different instances
-    nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance('../instances/p2050/p2050-01.cpmp')
+    filename = '../instances/p2050/p2050-01.cpmp'
+    
+    # If streaming is True, the instance is converted once into a memory-mapped binary and the distances 
+    # are read lazily per median; use this for instances whose distance matrix does not fit into memory.
+    # Streaming requires startcolumns, preprocessing, rootfixing and hybrid to be off, since they need the whole matrix.
+    # If knearest is not None, only the knearest closest medians of each location are considered in pricing.
+    streaming = False
+    knearest = None
+    
+    candidates = None
+    if streaming:
+        instance = reader_cpmp.open_instance(filename, knearest)
+        nlocations, nclusters, distances, demands, capacities = instance.nlocations, instance.nclusters, instance.distances, instance.demands, instance.capacities
+        candidates = instance.candidates
+    else:
+        nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance(filename)
+        if knearest is not None:
+            candidates = reader_cpmp.median_candidates(reader_cpmp.knearest_medians(distances.matrix, knearest), nlocations)
     
     # If solveinteger is True, we will solve the problem as an Integer Program, i.e., variables will be added as binary 'B' variables.
     # If solveinteger is False, we will solve the LP-relaxation, i.e., variables will be added as continuous 'C' variables.
@@ -140,7 +321,72 @@ if __name__ == '__main__':
     ############################################################################################################
     semiassignmentbranching = True
     
-    use_mip = False # do we use the mip solver instead of googles knapsack solver?
+    use_mip = False # do we use the mip solver instead of the dynamic programming knapsack solver?
+    
+    # If parallel is 'process' (resp. 'thread'), the pricing problems are solved by a pool of nworkers worker processes 
+    # (resp. threads), None for one worker per available core. If parallel is None, they are solved sequentially.
+    parallel = None
+    nworkers = None
+    
+    # Pricing strategy, one of pricer_cpmp.PRICING_STRATEGIES; maxcolumns limits the columns added per round 
+    # (required for every strategy but 'full')
+    strategy = "full"
+    maxcolumns = None
+    
+    # Dual stabilization, one of pricer_cpmp.STABILIZATIONS; smoothing is the weight of the stability center for 'wentges',
+    # boxwidth the half-width of the box around the stability center for 'box', relative to its mean absolute dual
+    stabilization = None
+    smoothing = 0.5
+    boxwidth = 0.5
+    
+    # If startcolumns is True, the master is seeded with the columns of heuristic solutions (see heuristic_cpmp)
+    startcolumns = False
+    
+    # If columnpool is True, columns found in pricing but not added are kept in a pool that is scanned before the knapsacks
+    columnpool = False
+    
+    # Location selection policy of the semi-assignment branching, one of branch_semiassign.SELECTION_POLICIES;
+    # benchmark_branching compares the policies on a list of instances
+    branchingpolicy = "tiebreak"
+    
+    # Strong branching evaluates the nstrongcandidates best tiebreak locations. With nstrongrounds = 0, a child is only 
+    # estimated by the LP over the columns already in the master, otherwise additionally by nstrongrounds subgradient 
+    # steps on its Lagrangian bound (see branch_semiassign.BranchruleSemiassign.childEstimate)
+    nstrongcandidates = 5
+    nstrongrounds = 0
+    
+    # If pairbranching is True, we branch on single location-median assignments instead (see branch_assign), 
+    # regardless of semiassignmentbranching
+    pairbranching = False
+    
+    # If nodewarmstart is True, the pricing of a node starts with the columns of its parent's final LP solution, 
+    # adapted to the branching decision, and with the stability center of its parent
+    nodewarmstart = False
+    
+    # If preprocessing is True, assignments that cannot be part of a solution better than the best heuristic solution 
+    # are forbidden before solving (see preprocess_cpmp)
+    preprocessing = False
+    
+    # If rootfixing is True, the columns and assignments that cannot be part of a solution better than the incumbent 
+    # are fixed when the column generation of the root ends
+    rootfixing = False
+    
+    # Primal heuristic on the columns of the master, one of heur_restrictedmaster.PRIMAL_HEURISTICS, 
+    # called at every heuristicfreq-th depth of the tree
+    heuristic = None
+    heuristicfreq = 10
+    
+    # If localsearch is True, every new incumbent is improved by local search (see localsearch_cpmp)
+    localsearch = False
+    
+    # Hybrid start from the compact formulation, one of hybrid_cpmp.HYBRID_MODES: 'lp' solves the compact LP relaxation, 
+    # 'mip' additionally the compact IP under the time limit hybridtimelimit (see hybrid_cpmp)
+    hybrid = None
+    hybridtimelimit = 10.0
 
-    test_cpmp(nlocations, nclusters, distances, demands, capacities, solveinteger, semiassignmentbranching, use_mip)
+    test_cpmp(nlocations, nclusters, distances, demands, capacities, solveinteger, semiassignmentbranching, use_mip, candidates, parallel, 
+              strategy, maxcolumns, stabilization, smoothing, boxwidth, startcolumns, columnpool, branchingpolicy, pairbranching, 
+              nodewarmstart, preprocessing, rootfixing, heuristic, heuristicfreq, 
+              localsearch, hybrid, hybridtimelimit, nstrongcandidates = nstrongcandidates, nstrongrounds = nstrongrounds, 
+              nworkers = nworkers)
     
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local search primal heuristic for capacitated p-median problems
+
+Whenever SCIP has found a new incumbent, the heuristic converts it into clusters, improves them with the local search of
+localsearch_cpmp and passes the improved solution back to SCIP. HeurLocalSearchMaster works on the master of
+cpmp_extended: the clusters of the improved solution become pattern columns, such that the master gains the columns as 
+well. Variables cannot be added to the master outside of pricing, hence missing columns are handed to the pricer, which 
+adds them in its next round; the solution is passed to SCIP in the first call of the heuristic after that.
+HeurLocalSearchCompact works on the compact model of cpmp_compact.
+"""
+
+from abc import ABC, abstractmethod
+
+from pyscipopt import Heur, SCIP_RESULT
+
+import column_pool
+import localsearch_cpmp
+
+EPS = 1.e-10
+
+
+# local search on the incumbent, the subclasses convert between the solutions of their model and clusters
+class HeurLocalSearch(Heur, ABC):
+    def __init__(self, distances, demands, capacities):
+        super().__init__()
+        self.distances = distances
+        self.demands = demands
+        self.capacities = capacities
+
+        # objective value of the last incumbent the local search was applied to
+        self.lastobjective = None
+        # clusters of an improved solution that cannot be created yet, see HeurLocalSearchMaster
+        self.pendingClusters = None
+
+        # Statistics: number of calls and of improving solutions found
+        self.ncalls = 0
+        self.nsolutions = 0
+
+    #
+    # Methods of the models
+    #
+
+    """Clusters of a solution: list of (median, locations)"""
+    @abstractmethod
+    def solutionClusters(self, sol):
+        pass
+
+    """Create a solution from clusters, None if the model cannot represent it"""
+    @abstractmethod
+    def createSolution(self, clusters):
+        pass
+
+    #
+    # Callback methods
+    #
+
+    """execution method of primal heuristic, called whenever SCIP has a new incumbent"""
+    def heurexec(self, heurtiming, nodeinfeasible):
+        if self.pendingClusters is not None:
+            sol = self.createSolution(self.pendingClusters)
+            if sol is not None:
+                self.pendingClusters = None
+                if self.model.trySol(sol):
+                    self.nsolutions += 1
+                    return {"result": SCIP_RESULT.FOUNDSOL}
+            
+        if self.model.getNSols() == 0:
+            return {"result": SCIP_RESULT.DIDNOTRUN}
+
+        incumbent = self.model.getBestSol()
+        objective = self.model.getSolObjVal(incumbent)
+        if self.lastobjective is not None and objective >= self.lastobjective - EPS:
+            return {"result": SCIP_RESULT.DIDNOTRUN}
+        self.lastobjective = objective
+        self.ncalls += 1
+
+        improved = localsearch_cpmp.local_search(self.distances, self.demands, self.capacities, self.solutionClusters(incumbent))
+        if improved.cost >= objective - EPS:
+            return {"result": SCIP_RESULT.DIDNOTFIND}
+
+        sol = self.createSolution(improved.clusters)
+        if sol is not None and self.model.trySol(sol):
+            self.nsolutions += 1
+            self.lastobjective = improved.cost
+            return {"result": SCIP_RESULT.FOUNDSOL}
+        return {"result": SCIP_RESULT.DIDNOTFIND}
+
+
+class HeurLocalSearchMaster(HeurLocalSearch):
+    def __init__(self, pricer):
+        super().__init__(None, None, None)
+        self.pricer = pricer
+
+    """initialization method of primal heuristic: the instance data of the pricer is set when the problem is built"""
+    def heurinit(self):
+        self.distances = self.pricer.distances
+        self.demands = self.pricer.demands
+        self.capacities = self.pricer.capacities
+
+    def solutionClusters(self, sol):
+        return [(var.data.median, var.data.locations) for var in self.pricer.patternVars if self.model.getSolVal(sol, var) > 0.5]
+
+    def createSolution(self, clusters):
+        # empty clusters are not represented by a column
+        clusters = [(median, locations) for median, locations in clusters if locations]
+        solvars = [self.pricer.columnVars.get(column_pool.column_key(median, locations)) for median, locations in clusters]
+        if any(var is None for var in solvars):
+            self.pricer.queueColumns(clusters)
+            self.pendingClusters = clusters
+            return None
+        
+        sol = self.model.createSol(self)
+        for var in solvars:
+            self.model.setSolVal(sol, var, 1.0)
+        return sol
+
+
+class HeurLocalSearchCompact(HeurLocalSearch):
+    """
+    :param x: dictionary of the assignment variables, key (location, median)
+    :param y: dictionary of the median variables
+    """
+    def __init__(self, distances, demands, capacities, x, y):
+        super().__init__(distances, demands, capacities)
+        self.x = x
+        self.y = y
+
+    def solutionClusters(self, sol):
+        medians = [j for j in self.y if self.model.getSolVal(sol, self.y[j]) > 0.5]
+        locations = {j: [] for j in medians}
+        for (i, j), var in self.x.items():
+            if self.model.getSolVal(sol, var) > 0.5:
+                locations[j].append(i)
+        return [(j, locations[j]) for j in medians]
+
+    def createSolution(self, clusters):
+        # assignments removed by the preprocessing have no variable
+        if any((i, j) not in self.x for j, locations in clusters for i in locations):
+            return None
+        
+        sol = self.model.createSol(self)
+        for j, locations in clusters:
+            self.model.setSolVal(sol, self.y[j], 1.0)
+            for i in locations:
+                self.model.setSolVal(sol, self.x[i, j], 1.0)
+        return sol
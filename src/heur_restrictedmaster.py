@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Restricted master primal heuristics for capacitated p-median problems
+
+Both heuristics only use the columns present in the master, no columns are priced:
+    * restricted: the master restricted to its present columns is solved as an IP by a sub-SCIP under a time and node
+      limit (price-and-branch). It runs only if columns were added since its last call.
+    * diving: the columns are fixed to one at a time in an LP dive, the column whose locations are assigned most to its
+      median in the fractional assignment matrix (as computed by the branching rules) first. The dive ends with an
+      integral LP solution, an infeasible LP, an LP bound above the incumbent or after maxdivedepth fixings.
+PySCIPOpt solves dive LPs without pricing, hence the dive works on the present columns as well. As in the master, a
+location may be covered by more than one column of a solution: with the present columns only, requiring a partition
+of the locations leaves hardly any feasible solution.
+Only solutions better than the incumbent are passed to SCIP.
+"""
+
+from pyscipopt import Heur, Model, SCIP_RESULT, SCIP_LPSOLSTAT
+from pyscipopt.scip import quicksum
+
+import numpy
+
+EPS = 1.e-10
+
+# Primal heuristics of the master, see above; None for no heuristic
+PRIMAL_HEURISTICS = (None, "restricted", "diving")
+
+
+class HeurRestrictedMaster(Heur):
+    def __init__(self, pricer, mode = "restricted", timelimit = 1.0, nodelimit = 200, maxdivedepth = None):
+        super().__init__()
+        self.pricer = pricer
+
+        assert mode in PRIMAL_HEURISTICS and mode is not None
+        self.mode = mode
+        # limits of the sub-SCIP of the restricted master IP
+        self.timelimit = timelimit
+        self.nodelimit = nodelimit
+        # maximal number of columns fixed in a dive, None for twice the number of medians
+        self.maxdivedepth = maxdivedepth
+
+        # number of master columns in the last call of the restricted master IP
+        self.lastnvars = 0
+
+        # Statistics: number of calls and of improving solutions found
+        self.ncalls = 0
+        self.nsolutions = 0
+
+    #
+    # Local methods
+    #
+
+    """Largest objective value of an improving solution, None if there is no incumbent"""
+    def objectiveLimit(self):
+        primalbound = self.model.getPrimalbound()
+        if self.model.isInfinity(primalbound):
+            return None
+        return primalbound - 1.0 + EPS if self.pricer.solveinteger else primalbound - EPS
+
+    """Pass a solution given by its columns to SCIP
+
+    :param columns: indices of the columns of the solution
+    :return: True if the solution was stored as new incumbent
+    """
+    def trySolution(self, columns):
+        sol = self.model.createSol(self)
+        for i in columns:
+            self.model.setSolVal(sol, self.pricer.patternVars[i], 1.0)
+
+        stored = self.model.trySol(sol)
+        if stored:
+            self.nsolutions += 1
+        return stored
+
+    """Solve the master restricted to its present columns as an IP
+
+    :return: indices of the columns of the best solution found, None if no improving solution is found
+    """
+    def solveRestrictedMaster(self):
+        pricer = self.pricer
+        columns = [i for i, var in enumerate(pricer.patternVars) if var.getUbGlobal() > 0.5]
+
+        sub = Model("CPMP restricted master")
+        sub.hideOutput()
+        sub.setParam("limits/time", self.timelimit)
+        sub.setParam("limits/nodes", self.nodelimit)
+        if pricer.solveinteger:
+            sub.setObjIntegral()
+        limit = self.objectiveLimit()
+        if limit is not None:
+            sub.setObjlimit(limit)
+
+        x = {i: sub.addVar(vtype = 'B', obj = pricer.patternVars[i].getObj()) for i in columns}
+
+        membership = pricer.columnStore.membership[columns]
+        for location in range(pricer.nlocations):
+            sub.addCons(quicksum(x[columns[k]] for k in numpy.flatnonzero(membership[:, location])) >= 1)
+
+        medians = pricer.columnStore.medians[columns]
+        for median in numpy.unique(medians):
+            sub.addCons(quicksum(x[columns[k]] for k in numpy.flatnonzero(medians == median)) <= 1)
+        sub.addCons(quicksum(x.values()) <= pricer.nclusters)
+
+        sub.optimize()
+        if sub.getNSols() == 0:
+            return None
+
+        # the objective limit does not keep the sub-SCIP from returning solutions that are not better than the incumbent
+        best = sub.getBestSol()
+        if limit is not None and sub.getSolObjVal(best) > limit:
+            return None
+        return [i for i in columns if sub.getSolVal(best, x[i]) > 0.5]
+
+    """Dive on the columns of the master, fixing the most assigned column first
+
+    :return: indices of the columns of an integral dive LP solution, None if the dive fails or finds no improving solution
+    """
+    def dive(self):
+        pricer = self.pricer
+        maxdivedepth = self.maxdivedepth if self.maxdivedepth is not None else 2 * pricer.nclusters
+        limit = self.objectiveLimit()
+
+        solution = None
+        self.model.startDive()
+        for _ in range(maxdivedepth + 1):
+            values = numpy.fromiter((var.getLPSol() for var in pricer.patternVars), dtype = float, count = pricer.nvars)
+            fractional = (values > EPS) & (values < 1.0 - self.model.feastol())
+            if not fractional.any():
+                if limit is None or self.model.getLPObjVal() <= limit:
+                    solution = numpy.flatnonzero(values > 0.5).tolist()
+                break
+
+            # the most assigned column: the largest mean assignment value of its locations to its median
+            assignments = pricer.columnStore.assignmentMatrix(values)
+            membership = pricer.columnStore.membership[:pricer.nvars]
+            medians = pricer.columnStore.medians[:pricer.nvars]
+            sizes = numpy.maximum(membership.sum(axis = 1), 1)
+            scores = (membership * assignments.T[medians]).sum(axis = 1) / sizes
+            column = int(numpy.argmax(numpy.where(fractional, scores, -numpy.inf)))
+
+            self.model.chgVarLbDive(pricer.patternVars[column], 1.0)
+
+            lperror, cutoff = self.model.solveDiveLP()
+            if lperror or cutoff or self.model.getLPSolstat() != SCIP_LPSOLSTAT.OPTIMAL:
+                break
+            if limit is not None and self.model.getLPObjVal() > limit:
+                break
+        self.model.endDive()
+
+        return solution
+
+    #
+    # Callback methods
+    #
+
+    """execution method of primal heuristic, called after the LP of a node is solved"""
+    def heurexec(self, heurtiming, nodeinfeasible):
+        if nodeinfeasible or self.model.getLPSolstat() != SCIP_LPSOLSTAT.OPTIMAL:
+            return {"result": SCIP_RESULT.DIDNOTRUN}
+
+        if self.mode == "restricted":
+            # the same columns give the same restricted master
+            if self.pricer.nvars == self.lastnvars:
+                return {"result": SCIP_RESULT.DIDNOTRUN}
+            self.lastnvars = self.pricer.nvars
+            self.ncalls += 1
+            columns = self.solveRestrictedMaster()
+        else:
+            self.ncalls += 1
+            columns = self.dive()
+
+        if columns is not None and self.trySolution(columns):
+            return {"result": SCIP_RESULT.FOUNDSOL}
+        return {"result": SCIP_RESULT.DIDNOTFIND}
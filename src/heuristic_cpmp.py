@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Construction heuristics for the capacitated p-median problem
+
+The solutions are used to seed the master problem with start columns (one column per cluster) and to give SCIP an
+incumbent before the branch and price starts. A solution is constructed in three steps:
+    * p well-spread medians are chosen by farthest-point insertion,
+    * the locations are assigned to the medians, greedily by decreasing demand or by largest regret,
+    * the medians are moved to the best location of their cluster and the locations are reassigned, until no improvement.
+Randomized restarts vary the first median of the farthest-point insertion.
+"""
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy
+
+EPS = 1.e-10
+
+
+# solution of the CPMP
+@dataclass
+class HeuristicSolution:
+    cost: float
+    clusters: List[Tuple[int, List[int]]] # (median, locations) per open median
+
+
+"""Choose well-spread medians by farthest-point insertion
+
+:param distances: distance matrix, first index location, second index median
+:param nclusters: number of medians to choose
+:param first: first median
+:return: array of medians
+"""
+def spread_medians(distances, nclusters, first):
+    medians = [int(first)]
+    # distance of every location to the closest chosen median
+    mindistances = numpy.array(distances[:, first], dtype = float)
+
+    while len(medians) < nclusters:
+        mindistances[medians] = -1.0
+        median = int(numpy.argmax(mindistances))
+        medians.append(median)
+        mindistances = numpy.minimum(mindistances, distances[:, median])
+
+    return numpy.array(medians, dtype = numpy.int64)
+
+"""Assign each location to the closest median with sufficient residual capacity, locations by decreasing demand
+
+The medians are assigned to themselves first.
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param medians: array of medians
+:return: array with the index in medians of the median of every location, None if the greedy fails
+"""
+def greedy_assignment(distances, demands, capacities, medians):
+    residual = numpy.array(capacities[medians], dtype = numpy.int64)
+    costs = numpy.asarray(distances[:, medians], dtype = float)
+    assignment = numpy.full(len(demands), -1, dtype = numpy.int64)
+
+    ismedian = numpy.zeros(len(demands), dtype = bool)
+    ismedian[medians] = True
+    others = numpy.flatnonzero(~ismedian)
+    order = numpy.concatenate((medians, others[numpy.argsort(-demands[others], kind = "stable")]))
+
+    for location in order:
+        feasible = numpy.flatnonzero(residual >= demands[location])
+        if len(feasible) == 0:
+            return None
+        k = feasible[numpy.argmin(costs[location, feasible])]
+        assignment[location] = k
+        residual[k] -= demands[location]
+
+    return assignment
+
+"""Assign the locations by largest regret
+
+In every step, the location with the largest difference between the distances to its closest and its second closest
+median with sufficient residual capacity is assigned to the closest one.
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param medians: array of medians
+:return: array with the index in medians of the median of every location, None if the assignment fails
+"""
+def regret_assignment(distances, demands, capacities, medians):
+    residual = numpy.array(capacities[medians], dtype = numpy.int64)
+    costs = numpy.asarray(distances[:, medians], dtype = float)
+    assignment = numpy.full(len(demands), -1, dtype = numpy.int64)
+
+    unassigned = numpy.ones(len(demands), dtype = bool)
+    while unassigned.any():
+        locations = numpy.flatnonzero(unassigned)
+        feasiblecosts = numpy.where(demands[locations, None] <= residual[None, :], costs[locations], numpy.inf)
+
+        if len(medians) >= 2:
+            twobest = numpy.partition(feasiblecosts, 1, axis = 1)[:, :2]
+        else:
+            twobest = numpy.column_stack((feasiblecosts[:, 0], numpy.full(len(locations), numpy.inf)))
+        if numpy.isinf(twobest[:, 0]).any():
+            return None
+
+        # a location with a single feasible median has infinite regret
+        regrets = twobest[:, 1] - twobest[:, 0]
+        i = int(numpy.argmax(regrets))
+        location = locations[i]
+        k = int(numpy.argmin(feasiblecosts[i]))
+
+        assignment[location] = k
+        residual[k] -= demands[location]
+        unassigned[location] = False
+
+    return assignment
+
+"""Cost of an assignment"""
+def assignment_cost(distances, medians, assignment):
+    return float(numpy.asarray(distances[numpy.arange(len(assignment)), medians[assignment]], dtype = float).sum())
+
+"""Move every median to the location of its cluster with minimal total distance and sufficient capacity
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param medians: array of medians
+:param assignment: array with the index in medians of the median of every location
+:return: array of new medians
+"""
+def recenter_medians(distances, demands, capacities, medians, assignment):
+    newmedians = medians.copy()
+    for k in range(len(medians)):
+        cluster = numpy.flatnonzero(assignment == k)
+        candidates = cluster[capacities[cluster] >= demands[cluster].sum()]
+        if len(candidates) == 0:
+            continue
+        totals = numpy.asarray(distances[numpy.ix_(cluster, candidates)], dtype = float).sum(axis = 0)
+        newmedians[k] = candidates[numpy.argmin(totals)]
+
+    return newmedians
+
+"""Construct a solution from start medians by assignment and recentering (location-allocation)
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param medians: array of start medians
+:param assign: assignment function, greedy_assignment or regret_assignment
+:param maxiterations: maximal number of recentering steps
+:return: HeuristicSolution, None if no feasible assignment is found
+"""
+def locate_allocate(distances, demands, capacities, medians, assign, maxiterations = 10):
+    assignment = assign(distances, demands, capacities, medians)
+    if assignment is None:
+        return None
+    cost = assignment_cost(distances, medians, assignment)
+
+    for _ in range(maxiterations):
+        newmedians = recenter_medians(distances, demands, capacities, medians, assignment)
+        if numpy.array_equal(newmedians, medians):
+            break
+        newassignment = assign(distances, demands, capacities, newmedians)
+        if newassignment is None:
+            break
+        newcost = assignment_cost(distances, newmedians, newassignment)
+        if newcost >= cost - EPS:
+            break
+        medians, assignment, cost = newmedians, newassignment, newcost
+
+    clusters = [(int(median), [int(location) for location in numpy.flatnonzero(assignment == k)]) for k, median in enumerate(medians)]
+    return HeuristicSolution(cost, clusters)
+
+"""Construct start solutions of the CPMP
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param nclusters: number of medians
+:param nrestarts: number of randomized restarts in addition to the deterministic start
+:param seed: seed of the random first medians
+:return: list of distinct HeuristicSolution, sorted by cost
+"""
+def construct_solutions(distances, demands, capacities, nclusters, nrestarts = 4, seed = 0):
+    nlocations = len(demands)
+    demands = numpy.asarray(demands, dtype = numpy.int64)
+    capacities = numpy.asarray(capacities, dtype = numpy.int64)
+    if nclusters < 1 or nclusters > nlocations:
+        return []
+
+    # the deterministic start is the 1-median of all locations, the restarts start with random medians
+    rng = numpy.random.default_rng(seed)
+    firsts = [int(numpy.argmin(numpy.asarray(distances, dtype = float).sum(axis = 0)))]
+    firsts += [int(first) for first in rng.integers(nlocations, size = nrestarts)]
+
+    solutions = {}
+    for first in firsts:
+        medians = spread_medians(distances, nclusters, first)
+        for assign in (greedy_assignment, regret_assignment):
+            solution = locate_allocate(distances, demands, capacities, medians, assign)
+            if solution is not None:
+                key = tuple(sorted((median, tuple(locations)) for median, locations in solution.clusters))
+                solutions[key] = solution
+
+    return sorted(solutions.values(), key = lambda solution: solution.cost)
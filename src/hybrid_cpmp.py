@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hybrid start of the branch-and-price of cpmp_extended from the compact formulation of cpmp_compact
+
+Before the master is solved, the LP relaxation of the compact formulation (with the strengthening x[i,j] <= y[j]) is
+solved. It provides
+    * the duals of its assignment constraints, which are used as the duals of the first pricing round of the master
+      (and as the first stability center), such that the first columns are priced with respect to good duals instead of
+      the Farkas duals of an empty master,
+    * start columns: for every median that is (partially) open in the LP solution, its locations in the order of
+      decreasing assignment value, as far as they fit into its capacity.
+With hybrid mode "mip", the compact formulation is additionally solved as an IP under a time limit; the clusters of its
+best solution are start columns as well and the solution is passed to the master as incumbent.
+"""
+
+from dataclasses import dataclass
+
+import numpy
+
+import cpmp_compact
+import heuristic_cpmp
+
+EPS = 1.e-10
+
+# Hybrid start modes, see above; None for no hybrid start
+HYBRID_MODES = (None, "lp", "mip")
+
+
+# start data derived from the compact formulation
+@dataclass
+class CompactStart:
+    bound: float               # value of the compact LP relaxation, -infinity if it was not solved to optimality
+    duals: numpy.ndarray       # assignment duals in the sign convention of the master (nonpositive), None if not available
+    columns: list              # (median, locations) of the start columns
+    solution: heuristic_cpmp.HeuristicSolution = None # best solution of the compact IP, None if not solved or none found
+
+
+"""Clusters of a fractional compact solution: the locations of every open median in the order of decreasing assignment
+value (ties broken by distance), as far as they fit into its capacity
+
+:param assignments: assignment values, first index location, second index median
+:param openings: opening values of the medians
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:return: list of (median, locations) with nonempty locations
+"""
+def fractional_clusters(assignments, openings, distances, demands, capacities):
+    clusters = []
+    for median in numpy.flatnonzero(openings > EPS):
+        candidates = numpy.flatnonzero(assignments[:, median] > EPS)
+        candidates = candidates[numpy.lexsort((distances[candidates, median], -assignments[candidates, median]))]
+
+        locations = []
+        residual = capacities[median]
+        for location in candidates:
+            if demands[location] <= residual:
+                locations.append(int(location))
+                residual -= demands[location]
+        if locations:
+            clusters.append((int(median), sorted(locations)))
+
+    return clusters
+
+"""Values of the assignment and median variables of a compact solution
+
+:param model: compact model
+:param sol: solution, None for the current LP solution
+:param x: dictionary of the assignment variables, key (location, median)
+:param y: dictionary of the median variables
+:param nlocations: number of locations
+:return: matrix of assignment values (first index location, second index median), array of opening values
+"""
+def compact_values(model, sol, x, y, nlocations):
+    assignments = numpy.zeros((nlocations, nlocations))
+    for (i, j), var in x.items():
+        assignments[i, j] = model.getSolVal(sol, var)
+    openings = numpy.array([model.getSolVal(sol, y[j]) for j in range(nlocations)])
+
+    return assignments, openings
+
+"""Solve the compact formulation and derive the start data of the master
+
+:param nlocations: number of locations
+:param nclusters: number of medians
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location; None if all are allowed
+:param mode: one of HYBRID_MODES (not None)
+:param timelimit: time limit of each compact solve in seconds
+:return: CompactStart
+"""
+def compact_start(nlocations, nclusters, distances, demands, capacities, forbidden = None, mode = "lp", timelimit = 10.0):
+    assert mode in HYBRID_MODES and mode is not None
+
+    model, x, y, assignmentConss = cpmp_compact.build_compact(nlocations, nclusters, distances, demands, capacities,
+                                                              solveinteger = False, forbidden = forbidden, strengthen = True)
+    model.hideOutput()
+    model.setParam("limits/time", timelimit)
+    model.optimize()
+
+    start = CompactStart(-numpy.inf, None, [])
+    if model.getStatus() == "optimal":
+        start.bound = model.getObjVal()
+        # the duals of the assignment constraints of the compact model are nonnegative, the duals of the master
+        # assignment constraints (written as <= -1) are nonpositive
+        start.duals = -numpy.maximum(numpy.array([model.getDualsolLinear(cons) for cons in assignmentConss]), 0.0)
+
+        assignments, openings = compact_values(model, None, x, y, nlocations)
+        start.columns = fractional_clusters(assignments, openings, distances, demands, capacities)
+
+    if mode == "mip":
+        model, x, y, _ = cpmp_compact.build_compact(nlocations, nclusters, distances, demands, capacities, forbidden = forbidden,
+                                                    strengthen = True)
+        model.hideOutput()
+        model.setParam("limits/time", timelimit)
+        model.optimize()
+
+        if model.getNSols() > 0:
+            assignments, openings = compact_values(model, model.getBestSol(), x, y, nlocations)
+            clusters = [(int(median), [int(location) for location in numpy.flatnonzero(assignments[:, median] > 0.5)])
+                        for median in numpy.flatnonzero(openings > 0.5)]
+            clusters = [(median, locations) for median, locations in clusters if locations]
+            start.solution = heuristic_cpmp.HeuristicSolution(model.getObjVal(), clusters)
+            start.columns += clusters
+
+    return start
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dynamic programming knapsack solver for the CPMP pricing problems
+
+All pricing problems share the item weights (the demands of the locations); they only differ in the
+capacity of the median and in the distance term of the profits. The solver is therefore created once
+with the weights and the largest capacity and reuses its buffers for every median and pricing round.
+Profits are handled as floats, no scaling to integers is necessary.
+"""
+
+import numpy
+
+EPS = 1.e-10
+
+
+class KnapsackDP:
+    def __init__(self, weights, maxcapacity):
+        self.weights = numpy.asarray(weights, dtype = numpy.int64)
+        self.nitems = len(self.weights)
+        self.maxcapacity = int(maxcapacity)
+
+        assert self.nitems == 0 or self.weights.min() >= 0
+
+        # best[c]: best profit with total weight at most c among the items processed so far
+        self.best = numpy.empty(self.maxcapacity + 1, dtype = float)
+        # take[k, c]: is the k-th processed item packed in the best solution with capacity c?
+        self.take = numpy.empty((self.nitems, self.maxcapacity + 1), dtype = bool)
+        self.cand = numpy.empty(self.maxcapacity + 1, dtype = float)
+
+    """Solve a 0/1 knapsack problem over a subset of the items
+
+    :param profits: profits of the items, same length as items (or as the weights if items is None)
+    :param capacity: capacity of the knapsack, at most maxcapacity
+    :param items: indices of the items the profits belong to, None if profits are given for all items
+    :return: sorted array of packed items and their total profit
+    """
+    def solve(self, profits, capacity, items = None):
+        capacity = int(capacity)
+        assert 0 <= capacity <= self.maxcapacity
+
+        profits = numpy.asarray(profits, dtype = float)
+        if items is None:
+            items = numpy.arange(self.nitems)
+        else:
+            items = numpy.asarray(items, dtype = numpy.int64)
+        assert len(profits) == len(items)
+
+        # only items with positive profit that fit into the knapsack on their own can be part of a best solution
+        weights = self.weights[items]
+        useful = (profits > EPS) & (weights <= capacity)
+        items = items[useful]
+        profits = profits[useful]
+        weights = weights[useful]
+
+        # trivial case: all useful items fit
+        if weights.sum() <= capacity:
+            return items, float(profits.sum())
+
+        best = self.best[:capacity + 1]
+        best.fill(0.0)
+
+        for k in range(len(items)):
+            w = weights[k]
+            cand = self.cand[:capacity + 1 - w]
+            numpy.add(best[:capacity + 1 - w], profits[k], out = cand)
+            take = self.take[k, :capacity + 1]
+            take[:w] = False
+            numpy.greater(cand, best[w:], out = take[w:])
+            numpy.maximum(best[w:], cand, out = best[w:])
+
+        # reconstruct the packing
+        packed = []
+        c = capacity
+        for k in range(len(items) - 1, -1, -1):
+            if self.take[k, c]:
+                packed.append(items[k])
+                c -= weights[k]
+
+        packed = numpy.array(packed[::-1], dtype = numpy.int64)
+        return packed, float(best[capacity])
+
+    """Best profits of a 0/1 knapsack problem over a subset of the items for every capacity up to a given capacity
+
+    :param profits: profits of the items, same length as items (or as the weights if items is None)
+    :param capacity: largest capacity, at most maxcapacity
+    :param items: indices of the items the profits belong to, None if profits are given for all items
+    :return: array of length capacity + 1, entry c is the best total profit with total weight at most c
+    """
+    def values(self, profits, capacity, items = None):
+        capacity = int(capacity)
+        assert 0 <= capacity <= self.maxcapacity
+
+        profits = numpy.asarray(profits, dtype = float)
+        if items is None:
+            items = numpy.arange(self.nitems)
+        else:
+            items = numpy.asarray(items, dtype = numpy.int64)
+        assert len(profits) == len(items)
+
+        weights = self.weights[items]
+        useful = (profits > EPS) & (weights <= capacity)
+
+        best = numpy.zeros(capacity + 1)
+        for w, profit in zip(weights[useful], profits[useful]):
+            # the right-hand side is evaluated before best is updated, i.e., every item is packed at most once
+            numpy.maximum(best[w:], best[:capacity + 1 - w] + profit, out = best[w:])
+
+        return best
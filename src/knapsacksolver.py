@@ -4,6 +4,8 @@
 from pyscipopt import Model, quicksum, SCIP_PARAMSETTING
 import reader_cpmp
 
+EPS = 1.e-10
+
 def solve(profits, weights, capacity):
     model = Model()
 
@@ -15,20 +17,77 @@ def solve(profits, weights, capacity):
 
     # Initizalization of the variables
     x = {} # do we pack item i?
-    
+
     # Create the variables
     nItems = len(profits)
-    
+
     for i in range(nItems):
         x[i] = model.addVar(vtype = 'B', name="x(%s)"%(i)) # x[i] == 1 iff. item i is packed into the knapsack
 
     # Create the objective function: maximize profits of packed items
     model.setObjective(quicksum(profits[i] * x[i] for i in range(nItems)), "maximize")
 
-    # Create the capacity constraints: we can pack at most [capacity] weight
-    for i in range(nItems):
-        model.addCons(quicksum(weights[i] * x[i] for i in range(nItems)) <= capacity)
+    # Create the capacity constraint: we can pack at most [capacity] weight
+    model.addCons(quicksum(weights[i] * x[i] for i in range(nItems)) <= capacity)
 
     # optimize
     model.optimize()
-    return list([i for i in range(nItems) if not model.isZero(model.getVal(x[i]))])
\ No newline at end of file
+    return list([i for i in range(nItems) if not model.isZero(model.getVal(x[i]))])
+
+
+# Persistent knapsack model for the pricing problem of one median.
+#
+# The model is built once with one binary variable per location and a single capacity row;
+# between two calls only the objective and the upper bounds of the variables change.
+# The best packing of the previous call is passed to SCIP as a start solution.
+class KnapsackMIP:
+    def __init__(self, weights, capacity):
+        self.model = Model()
+        self.model.hideOutput()
+
+        self.nitems = len(weights)
+        self.x = [self.model.addVar(vtype = 'B', name="x(%s)"%(i)) for i in range(self.nitems)]
+        self.model.addCons(quicksum(int(weights[i]) * self.x[i] for i in range(self.nitems)) <= int(capacity))
+        self.model.setMaximize()
+
+        # items packed in the last optimal solution
+        self.lastpacked = []
+
+    """Solve the knapsack problem for new profits
+
+    :param profits: profit of every item
+    :param forbidden: None or, for every item, whether it may not be packed
+    :param forced: None or, for every item, whether it has to be packed
+    :return: list of packed items
+    """
+    def solve(self, profits, forbidden = None, forced = None):
+        assert len(profits) == self.nitems
+
+        # back to the problem stage to modify the model
+        self.model.freeTransform()
+
+        allowed = []
+        for i in range(self.nitems):
+            isforced = forced is not None and forced[i]
+            # items without positive profit are never packed in an optimal solution
+            fixzero = not isforced and (profits[i] <= EPS or (forbidden is not None and forbidden[i]))
+            self.model.chgVarLb(self.x[i], 1.0 if isforced else 0.0)
+            self.model.chgVarUb(self.x[i], 0.0 if fixzero else 1.0)
+            allowed.append(not fixzero)
+        
+        # the objective is replaced as a whole, the coefficients of fixed items are dropped
+        self.model.setObjective(quicksum(float(profits[i]) * self.x[i] for i in range(self.nitems) if allowed[i]), "maximize", clear = True)
+
+        # warm start: the allowed part of the previous packing is still feasible if no items are forced
+        warmstart = [i for i in self.lastpacked if allowed[i]]
+        if warmstart and forced is None:
+            sol = self.model.createSol()
+            for i in warmstart:
+                self.model.setSolVal(sol, self.x[i], 1.0)
+            self.model.addSol(sol, free = True)
+
+        self.model.optimize()
+
+        sol = self.model.getBestSol()
+        self.lastpacked = [i for i in range(self.nitems) if allowed[i] and self.model.getSolVal(sol, self.x[i]) > 0.5]
+        return list(self.lastpacked)
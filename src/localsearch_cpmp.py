@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local search improvement heuristic for the capacitated p-median problem
+
+A solution is given by its medians and an assignment (for every location the index of its median in medians), together
+with the residual capacities of the medians. Three neighbourhoods are searched until none of them improves:
+    * shift:    move a location to another median with sufficient residual capacity,
+    * swap:     exchange the medians of two locations if both residual capacities stay nonnegative,
+    * relocate: move a median to another location that is no median and whose capacity holds the cluster.
+Every neighbourhood evaluates the cost changes of all moves of a location (resp. median) at once and applies the best
+improving move, the costs are updated incrementally. heur_localsearch applies the local search to the solutions found
+by SCIP, in the master of cpmp_extended and in the compact model.
+
+Run as a script, the local search improves the construction heuristic solutions of an instance:
+    python localsearch_cpmp.py ../instances/p550/p550-01.cpmp
+"""
+
+import sys
+
+import numpy
+
+import heuristic_cpmp
+import reader_cpmp
+
+EPS = 1.e-10
+
+
+"""Medians and assignment of a solution given by its clusters
+
+:param clusters: list of (median, locations) of the solution
+:param nlocations: number of locations
+:return: array of medians, array with the index in medians of the median of every location
+"""
+def solution_arrays(clusters, nlocations):
+    medians = numpy.array([median for median, _ in clusters], dtype = numpy.int64)
+    assignment = numpy.full(nlocations, -1, dtype = numpy.int64)
+    for k, (_, locations) in enumerate(clusters):
+        assignment[list(locations)] = k
+
+    return medians, assignment
+
+"""Clusters of a solution given by its medians and assignment, including empty clusters"""
+def solution_clusters(medians, assignment):
+    return [(int(median), [int(location) for location in numpy.flatnonzero(assignment == k)]) for k, median in enumerate(medians)]
+
+"""Apply the best improving shift of every location, one location after the other
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param medians: array of medians
+:param assignment: assignment, changed in place
+:param residual: residual capacities of the medians, changed in place
+:return: total cost change (nonpositive)
+"""
+def shift_moves(distances, demands, medians, assignment, residual):
+    total = 0.0
+    for location in range(len(assignment)):
+        current = assignment[location]
+        costs = numpy.asarray(distances[location, medians], dtype = float)
+        deltas = numpy.where(residual >= demands[location], costs - costs[current], numpy.inf)
+        deltas[current] = numpy.inf
+
+        k = int(numpy.argmin(deltas))
+        if deltas[k] < -EPS:
+            residual[current] += demands[location]
+            residual[k] -= demands[location]
+            assignment[location] = k
+            total += deltas[k]
+
+    return total
+
+"""Apply the best improving swap of every location with a location of another median, one location after the other
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param medians: array of medians
+:param assignment: assignment, changed in place
+:param residual: residual capacities of the medians, changed in place
+:return: total cost change (nonpositive)
+"""
+def swap_moves(distances, demands, medians, assignment, residual):
+    nlocations = len(assignment)
+    locations = numpy.arange(nlocations)
+    total = 0.0
+    for location in range(nlocations):
+        a = assignment[location]
+        b = assignment
+        # location moves to the median b of every other location, which moves to median a
+        deltas = (numpy.asarray(distances[location, medians[b]], dtype = float) + numpy.asarray(distances[locations, medians[a]], dtype = float)
+                  - float(distances[location, medians[a]]) - numpy.asarray(distances[locations, medians[b]], dtype = float))
+        exchange = demands[location] - demands
+        feasible = (b != a) & (residual[a] + exchange >= 0) & (residual[b] - exchange >= 0)
+        deltas = numpy.where(feasible, deltas, numpy.inf)
+
+        other = int(numpy.argmin(deltas))
+        if deltas[other] < -EPS:
+            b = assignment[other]
+            residual[a] += exchange[other]
+            residual[b] -= exchange[other]
+            assignment[location], assignment[other] = b, a
+            total += deltas[other]
+
+    return total
+
+"""Apply the best improving relocation of every median
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param medians: array of medians, changed in place
+:param assignment: assignment
+:param residual: residual capacities of the medians, changed in place
+:return: total cost change (nonpositive)
+"""
+def relocate_medians(distances, demands, capacities, medians, assignment, residual):
+    total = 0.0
+    for k in range(len(medians)):
+        cluster = numpy.flatnonzero(assignment == k)
+        if len(cluster) == 0:
+            continue
+        load = int(demands[cluster].sum())
+
+        costs = numpy.asarray(distances[cluster, :], dtype = float).sum(axis = 0)
+        feasible = capacities >= load
+        feasible[medians] = False
+        deltas = numpy.where(feasible, costs - costs[medians[k]], numpy.inf)
+
+        median = int(numpy.argmin(deltas))
+        if deltas[median] < -EPS:
+            medians[k] = median
+            residual[k] = capacities[median] - load
+            total += deltas[median]
+
+    return total
+
+"""Improve a solution by shift, swap and relocate moves until no move improves
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param clusters: list of (median, locations) of a feasible solution
+:param maxrounds: maximal number of rounds over all neighbourhoods
+:return: HeuristicSolution with the improved solution
+"""
+def local_search(distances, demands, capacities, clusters, maxrounds = 100):
+    demands = numpy.asarray(demands, dtype = numpy.int64)
+    capacities = numpy.asarray(capacities, dtype = numpy.int64)
+    medians, assignment = solution_arrays(clusters, len(demands))
+    assert (assignment >= 0).all()
+
+    residual = capacities[medians] - numpy.bincount(assignment, weights = demands, minlength = len(medians)).astype(numpy.int64)
+    assert (residual >= 0).all()
+
+    for _ in range(maxrounds):
+        delta = shift_moves(distances, demands, medians, assignment, residual)
+        delta += swap_moves(distances, demands, medians, assignment, residual)
+        delta += relocate_medians(distances, demands, capacities, medians, assignment, residual)
+        if delta > -EPS:
+            break
+
+    return heuristic_cpmp.HeuristicSolution(heuristic_cpmp.assignment_cost(distances, medians, assignment), solution_clusters(medians, assignment))
+
+
+if __name__ == '__main__':
+    filename = sys.argv[1] if len(sys.argv) > 1 else '../instances/p550/p550-01.cpmp'
+
+    nlocations, nclusters, distances, demands, capacities = reader_cpmp.read_instance_arrays(filename)
+    for solution in heuristic_cpmp.construct_solutions(distances, demands, capacities, nclusters):
+        improved = local_search(distances, demands, capacities, solution.clusters)
+        print("Construction: %10.2f   Local search: %10.2f" % (solution.cost, improved.cost))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel solution of the CPMP pricing problems
+
+Given the duals of a pricing round, the knapsack problems of the medians are independent. They are
+distributed over a pool of worker processes (or threads) in contiguous chunks of medians; the results
+are collected in the order of the medians, such that the columns are added deterministically.
+
+The item weights (demands) are shared with the worker processes once through shared memory. If the profits
+of all medians are computed as one matrix, it lives in shared memory as well: the pricer writes it into
+ParallelPricing.profits and per round only the medians and capacities are sent. Otherwise (e.g. with
+candidate lists), the profit vectors are sent with the tasks. Only the packed items are returned.
+"""
+
+import atexit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import os
+import threading
+
+import numpy
+
+import knapsack_dp
+
+# knapsack solver of a worker process, created by the pool initializer
+_processKnapsack = None
+# shared memory block the weights and the profit matrix of the worker process live in
+_processShm = None
+# shared profit matrix of the worker process, first index median, second index location; None if not shared
+_processProfits = None
+
+def _initProcess(shmname, nitems, dtype, maxcapacity, profitmatrix):
+    global _processKnapsack, _processShm, _processProfits
+    _processShm = shared_memory.SharedMemory(name = shmname)
+    weights = numpy.ndarray((nitems,), dtype = dtype, buffer = _processShm.buf)
+    _processKnapsack = knapsack_dp.KnapsackDP(weights, maxcapacity)
+    if profitmatrix:
+        _processProfits = numpy.ndarray((nitems, nitems), dtype = float, buffer = _processShm.buf, offset = weights.nbytes)
+
+def _solveChunkProcess(tasks):
+    return [_processKnapsack.solve(profits, capacity, items)[0] for items, profits, capacity in tasks]
+
+def _solveMediansProcess(tasks):
+    return [_processKnapsack.solve(_processProfits[median], capacity)[0] for median, capacity in tasks]
+
+
+# pool of knapsack solvers; with profitmatrix, the profit matrix of all medians (first index median, second index
+# location) is held in ParallelPricing.profits and shared with the workers, see solveMedians
+class ParallelPricing:
+    def __init__(self, demands, maxcapacity, mode = "process", nworkers = None, profitmatrix = False):
+        assert mode in ("process", "thread")
+        self.mode = mode
+        self.nworkers = nworkers if nworkers is not None else (os.cpu_count() or 1)
+        self.shm = None
+        self.profits = None
+
+        demands = numpy.asarray(demands, dtype = numpy.int64)
+        nitems = len(demands)
+
+        if mode == "process":
+            # one block: the weights, followed by the profit matrix
+            profitbytes = nitems * nitems * numpy.dtype(float).itemsize if profitmatrix else 0
+            self.shm = shared_memory.SharedMemory(create = True, size = max(1, demands.nbytes + profitbytes))
+            weights = numpy.ndarray(demands.shape, dtype = demands.dtype, buffer = self.shm.buf)
+            weights[:] = demands
+            if profitmatrix:
+                self.profits = numpy.ndarray((nitems, nitems), dtype = float, buffer = self.shm.buf, offset = demands.nbytes)
+            self.executor = ProcessPoolExecutor(self.nworkers, initializer = _initProcess,
+                                                initargs = (self.shm.name, nitems, demands.dtype, maxcapacity, profitmatrix))
+        else:
+            # the knapsack buffers are not thread-safe, each thread gets its own solver
+            self.demands = demands
+            self.maxcapacity = maxcapacity
+            self.local = threading.local()
+            if profitmatrix:
+                self.profits = numpy.empty((nitems, nitems))
+            self.executor = ThreadPoolExecutor(self.nworkers)
+
+        # the pricer closes the pool when the solve ends; if it is aborted, e.g., by an exception, the shared memory is
+        # released at exit at the latest
+        atexit.register(self.close)
+
+    def _solveChunkThread(self, tasks):
+        if not hasattr(self.local, "knapsack"):
+            self.local.knapsack = knapsack_dp.KnapsackDP(self.demands, self.maxcapacity)
+        return [self.local.knapsack.solve(profits, capacity, items)[0] for items, profits, capacity in tasks]
+
+    def _solveMediansThread(self, tasks):
+        return self._solveChunkThread([(None, self.profits[median], capacity) for median, capacity in tasks])
+
+    """Solve a list of knapsack problems in parallel
+
+    :param tasks: list of (items, profits, capacity) as expected by KnapsackDP.solve
+    :return: list of arrays of packed items, in the order of the tasks
+    """
+    def solve(self, tasks):
+        return self._map(_solveChunkProcess if self.mode == "process" else self._solveChunkThread, tasks)
+
+    """Solve the knapsack problems of some medians over all items, with the profits in the shared profit matrix
+
+    The profits have to be written into ParallelPricing.profits before; it must not change until this method returns.
+
+    :param tasks: list of (median, capacity)
+    :return: list of arrays of packed items, in the order of the tasks
+    """
+    def solveMedians(self, tasks):
+        assert self.profits is not None
+        return self._map(_solveMediansProcess if self.mode == "process" else self._solveMediansThread, tasks)
+
+    def _map(self, solveChunk, tasks):
+        if not tasks:
+            return []
+
+        # one contiguous chunk per worker keeps the number of messages per round small
+        nchunks = min(self.nworkers, len(tasks))
+        bounds = numpy.linspace(0, len(tasks), nchunks + 1).astype(int)
+        chunks = [tasks[bounds[k]:bounds[k + 1]] for k in range(nchunks)]
+
+        packings = []
+        for result in self.executor.map(solveChunk, chunks):
+            packings.extend(result)
+
+        return packings
+
+    """Shut down the workers and release the shared memory; closing again does nothing"""
+    def close(self):
+        atexit.unregister(self.close)
+        self.executor.shutdown()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
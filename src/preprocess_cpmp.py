@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Preprocessing of capacitated p-median instances
+
+The reductions are computed between reading an instance and building a model. They are given as a boolean matrix of
+forbidden assignments (first index median, second index location, as in the pricer) and as a set of closed medians:
+    * capacity: a location whose demand exceeds the capacity of a median can never be assigned to it,
+    * cluster size: a median serves at most as many locations as the smallest allowed demands that fit its capacity,
+    * Lagrangian fixing: with multipliers u for the assignment constraints, the Lagrangian bound of all solutions that
+      assign location l to median m (resp. that open median m) is computed from the knapsack of median m for every
+      capacity; if it shows that no such solution is better than the incumbent, the assignment is forbidden (resp.
+      the median is closed).
+The multipliers are improved by subgradient steps starting from the distances, the incumbent comes from the
+construction heuristics. The Lagrangian reductions only keep solutions that are strictly better than the incumbent and
+the incumbent itself, such that the reduced instance still contains an optimal solution.
+"""
+
+from dataclasses import dataclass
+
+import numpy
+
+import heuristic_cpmp
+import knapsack_dp
+
+EPS = 1.e-10
+
+
+# reductions of an instance
+@dataclass
+class Reductions:
+    forbidden: numpy.ndarray   # forbidden assignments, first index median, second index location
+    closed: numpy.ndarray      # for each median, whether it is not open in any solution better than the incumbent
+    maxsizes: numpy.ndarray    # for each median, the maximal number of locations of its cluster
+    lowerbound: float          # Lagrangian lower bound, -infinity if not computed
+    incumbent: heuristic_cpmp.HeuristicSolution = None # best known solution, None if not known
+
+    """number of forbidden assignments of medians that are not closed"""
+    def nforbidden(self):
+        return int(self.forbidden[~self.closed].sum())
+
+    """number of closed medians"""
+    def nclosed(self):
+        return int(self.closed.sum())
+
+
+"""Forbid the assignments whose demand exceeds the capacity of the median
+
+:param demands: array of demands
+:param capacities: array of capacities
+:return: boolean matrix of forbidden assignments, first index median, second index location
+"""
+def capacity_reductions(demands, capacities):
+    return demands[numpy.newaxis, :] > capacities[:, numpy.newaxis]
+
+"""Maximal cluster size of every median: the number of its smallest allowed demands that fit into its capacity
+
+:param demands: array of demands
+:param capacities: array of capacities
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location
+:return: array of cluster sizes
+"""
+def cluster_sizes(demands, capacities, forbidden):
+    allowed = numpy.where(forbidden, numpy.iinfo(numpy.int64).max // len(demands), demands[numpy.newaxis, :])
+    cumulated = numpy.cumsum(numpy.sort(allowed, axis = 1), axis = 1)
+    return (cumulated <= capacities[:, numpy.newaxis]).sum(axis = 1)
+
+"""Sum of the largest nclusters - 1 positive values without the value of each median
+
+:param values: array of knapsack values of the medians
+:param nclusters: number of medians
+:return: array, entry m is the sum of the largest nclusters - 1 positive values of the other medians
+"""
+def best_other_values(values, nclusters):
+    positive = numpy.maximum(values, 0.0)
+    order = numpy.argsort(-positive, kind = "stable")
+    rank = numpy.empty(len(values), dtype = numpy.int64)
+    rank[order] = numpy.arange(len(values))
+
+    best = positive[order[:nclusters - 1]].sum()
+    nextbest = positive[order[nclusters - 1]] if nclusters - 1 < len(values) else 0.0
+    # a median among the best nclusters - 1 is replaced by the next best one
+    return numpy.where(rank < nclusters - 1, best - positive + nextbest, best)
+
+"""Solve the Lagrangian relaxation of the assignment constraints
+
+:param distances: distance matrix, first index location, second index median
+:param capacities: array of capacities
+:param nclusters: number of medians
+:param multipliers: Lagrangian multipliers of the assignment constraints
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location
+:param closed: boolean array of closed medians
+:param knapsack: knapsack_dp.KnapsackDP over the demands
+:return: Lagrangian bound, array of the knapsack values of the medians, list of the clusters of the chosen medians
+"""
+def lagrangian_relaxation(distances, capacities, nclusters, multipliers, forbidden, closed, knapsack):
+    nlocations = len(multipliers)
+    values = numpy.full(nlocations, -numpy.inf)
+    packings = {}
+    for median in numpy.flatnonzero(~closed):
+        items = numpy.flatnonzero(~forbidden[median])
+        packings[median], values[median] = knapsack.solve(multipliers[items] - distances[items, median], capacities[median], items)
+
+    chosen = [median for median in numpy.argsort(-values, kind = "stable")[:nclusters] if values[median] > 0]
+    bound = float(multipliers.sum() - values[chosen].sum())
+
+    return bound, values, [packings[median] for median in chosen]
+
+"""Improve Lagrangian multipliers by subgradient steps with Polyak step sizes
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param nclusters: number of medians
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location
+:param upperbound: value of the incumbent, target of the step sizes
+:param nsteps: number of subgradient steps
+:return: best multipliers and their Lagrangian bound
+"""
+def subgradient_multipliers(distances, demands, capacities, nclusters, forbidden, upperbound, nsteps = 50):
+    nlocations = len(demands)
+    knapsack = knapsack_dp.KnapsackDP(demands, capacities.max())
+    closed = numpy.zeros(nlocations, dtype = bool)
+
+    # every location starts with the distance to its second closest median, the closest one is usually itself
+    multipliers = numpy.sort(numpy.where(forbidden.T, numpy.inf, distances), axis = 1)[:, min(1, nlocations - 1)]
+    multipliers = numpy.where(numpy.isfinite(multipliers), multipliers, 0.0).astype(float)
+
+    bestbound, bestmultipliers = -numpy.inf, multipliers
+    stepsize, nfails = 2.0, 0
+    for _ in range(nsteps):
+        bound, _, clusters = lagrangian_relaxation(distances, capacities, nclusters, multipliers, forbidden, closed, knapsack)
+        if bound > bestbound + EPS:
+            bestbound, bestmultipliers, nfails = bound, multipliers, 0
+        else:
+            nfails += 1
+            if nfails >= 5:
+                stepsize, nfails = stepsize / 2.0, 0
+
+        # subgradient of the relaxed assignment constraints: 1 - number of chosen clusters containing the location
+        subgradient = numpy.ones(nlocations)
+        for cluster in clusters:
+            subgradient[cluster] -= 1.0
+        norm = subgradient @ subgradient
+        if bound >= upperbound - EPS or norm <= EPS:
+            break
+
+        multipliers = numpy.maximum(multipliers + stepsize * (upperbound - bound) / norm * subgradient, 0.0)
+
+    return bestmultipliers, bestbound
+
+"""Largest objective value of a solution that is better than the incumbent
+
+:param upperbound: value of the incumbent
+:param integral: True if the objective value of every solution is integral
+"""
+def improving_threshold(upperbound, integral = True):
+    return upperbound - 1.0 if integral else upperbound
+
+"""Forbid the assignments and close the medians that are not part of any solution better than the incumbent
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param nclusters: number of medians
+:param multipliers: Lagrangian multipliers of the assignment constraints
+:param upperbound: value of the incumbent
+:param forbidden: boolean matrix of forbidden assignments, first index median, second index location; it is extended
+:param integral: True if the objective value of every solution is integral
+:return: boolean array of closed medians
+"""
+def lagrangian_fixing(distances, demands, capacities, nclusters, multipliers, upperbound, forbidden, integral = True):
+    nlocations = len(demands)
+    knapsack = knapsack_dp.KnapsackDP(demands, capacities.max())
+    threshold = improving_threshold(upperbound, integral)
+
+    tables = {}
+    values = numpy.full(nlocations, -numpy.inf)
+    for median in range(nlocations):
+        items = numpy.flatnonzero(~forbidden[median])
+        tables[median] = knapsack.values(multipliers[items] - distances[items, median], capacities[median], items)
+        values[median] = tables[median][-1]
+
+    others = multipliers.sum() - best_other_values(values, nclusters)
+
+    # a median is closed if even its best cluster does not lead to an improving solution
+    closed = others - values > threshold + EPS
+
+    for median in numpy.flatnonzero(~closed):
+        items = numpy.flatnonzero(~forbidden[median])
+        # best value of a cluster of the median containing the location; the value of the remaining capacity
+        # may pack the location a second time, which only weakens the bound
+        withitem = multipliers[items] - distances[items, median] + tables[median][capacities[median] - demands[items]]
+        forbidden[median, items[others[median] - withitem > threshold + EPS]] = True
+    forbidden[closed] = True
+
+    return closed
+
+"""Compute the reductions of an instance
+
+:param distances: distance matrix, first index location, second index median
+:param demands: array of demands
+:param capacities: array of capacities
+:param nclusters: number of medians
+:param incumbent: best known solution (heuristic_cpmp.HeuristicSolution), None to construct one heuristically
+:param nsteps: number of subgradient steps for the Lagrangian fixing, 0 to skip the Lagrangian fixing
+:param integral: True if the objective value of every solution is integral
+:return: Reductions
+"""
+def preprocess(distances, demands, capacities, nclusters, incumbent = None, nsteps = 50, integral = True):
+    distances = numpy.asarray(distances)
+    demands = numpy.asarray(demands, dtype = numpy.int64)
+    capacities = numpy.asarray(capacities, dtype = numpy.int64)
+    nlocations = len(demands)
+
+    forbidden = capacity_reductions(demands, capacities)
+    closed = numpy.zeros(nlocations, dtype = bool)
+    lowerbound = -numpy.inf
+
+    if incumbent is None:
+        solutions = heuristic_cpmp.construct_solutions(distances, demands, capacities, nclusters)
+        incumbent = solutions[0] if solutions else None
+
+    if incumbent is not None and nsteps > 0:
+        multipliers, lowerbound = subgradient_multipliers(distances, demands, capacities, nclusters, forbidden, incumbent.cost, nsteps)
+        closed = lagrangian_fixing(distances, demands, capacities, nclusters, multipliers, incumbent.cost, forbidden, integral)
+        
+        # the incumbent stays feasible
+        for median, locations in incumbent.clusters:
+            forbidden[median, locations] = False
+            closed[median] = False
+
+    return Reductions(forbidden, closed, cluster_sizes(demands, capacities, forbidden), lowerbound, incumbent)
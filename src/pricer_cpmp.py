@@ -7,69 +7,210 @@ Created on Mon Nov  9 13:52:43 2020
 """
 
 from __future__ import print_function
-from ortools.algorithms import pywrapknapsack_solver
 
 from pyscipopt import Model, Pricer, SCIP_RESULT, SCIP_PARAMSETTING
 from pyscipopt.scip import quicksum
 
 from dataclasses import dataclass
-from typing import List
+import time
 
-import math
+import numpy
+
+import column_pool
 import knapsacksolver
+import knapsack_dp
+import parallel_pricing
+import preprocess_cpmp
 
 EPS = 1.e-10
-LONG_INT_MAX = 9223372036854775807
+
+# Pricing strategies:
+#   full:       solve the pricing problems of all medians and add every improving column
+#   partial:    price the medians in their natural order, stop after maxcolumns improving columns
+#   roundrobin: as partial, but resume with the median following the last one priced in the previous round
+#   priority:   as partial, but price the medians with the most negative score of the last round first
+# Every strategy only stops early if it found improving columns, i.e., optimality is only declared after a full sweep.
+PRICING_STRATEGIES = ("full", "partial", "roundrobin", "priority")
+
+# Dual stabilization of reduced cost pricing (the assignment duals are stabilized, the others are used as they are):
+#   None:    price with the duals of the master LP
+#   wentges: price with smoothing * center + (1 - smoothing) * duals, center being the stability center
+#   box:     price with the duals projected onto a box of relative half-width boxwidth around the stability center
+# The stability center is the dual vector with the best Lagrangian bound at the current node. If the stabilized duals do
+# not yield a column with negative reduced cost (mispricing), the round is repeated with the duals of the master LP.
+STABILIZATIONS = (None, "wentges", "box")
+
 #
 # Data structures
 #
 
-# variable pricer data
-@dataclass
+# variable pricer data; the membership of the locations is also stored in the column store of the pricer
+@dataclass(slots = True)
 class PatternVarData:
     median: int
-    locations: List[int]
+    locations: numpy.ndarray # sorted locations of the cluster
+    index: int               # index of the column in the column store
+
+# Pricing state of a node, saved when its column generation ends and used to warm start the pricing of its children
+@dataclass
+class NodeState:
+    center: numpy.ndarray    # stability center (or assignment duals without stabilization) of the last pricing round
+    support: list            # (median, locations) of the columns with positive value in the final LP of the node
+    pending: list            # (median, locations) of improving columns that were not added, e.g., after stopping early
 
 
 class PricerCPMP(Pricer):       
-    def __init__(self, solveinteger, use_mip):
+    def __init__(self, solveinteger, use_mip, parallel = None, nworkers = None, strategy = "full", maxcolumns = None,
+                 stabilization = None, smoothing = 0.5, boxwidth = 0.5, columnpool = False, poolsize = 10000, poolage = 100,
+                 nodewarmstart = False, maxnodestates = 1000, rootfixing = False):
         self.nlocations = 0
         self.nclusters = 0
-        self.distances = {}
-        self.demands = {}
-        self.capacities = {}
+        # numpy arrays; distances: first index location, second index median
+        self.distances = None
+        self.demands = None
+        self.capacities = None
+        
+        # Candidate locations per median (k-nearest sparsification), None if every location is a candidate
+        self.candidates = None
     
         # Master Vardata
         self.patternVars = []
         self.nvars = 0
         self.nVarsMedian = {}
+        # Membership of the locations in the columns, index of a column is the index of its variable in patternVars
+        self.columnStore = None
+        # variable of every column in the master, key column_pool.column_key
+        self.columnVars = {}
         
         # Master Constraints
         self.assignmentConss = []
         self.convexityConss = []
         self.pmedianCons = None
         
-        # Forbiddenassignments used to communicate between branching and pricer
-        self.forbiddenassignments = {}
+        # Forbiddenassignments used to communicate between branching and pricer: boolean matrix, 
+        # first index median, second index location (sparse_assignments.SparseAssignments in streaming mode, also below)
+        self.forbiddenassignments = None
+        # Number of times each assignment is forbidden by the active branching decisions (same indices); 
+        # assignments forbidden for the whole tree are also stored in globalforbidden
+        self.forbiddencounts = None
+        self.globalforbidden = None
+        # Forced assignments of pair branching: boolean matrix, first index median, second index location;
+        # every column of the median has to contain the location. nforced is the number of forced assignments.
+        self.forcedassignments = None
+        self.nforced = 0
         
         # Solving LP relaxation or IP? 
         # If True, in addColumn variables are added as 'B' 
         # If False, in addColumn variables are added as 'C' 
         self.solveinteger = solveinteger
         
-        self.use_mip = use_mip # if true we use the mip solver instead of the google knapsack solver
+        self.use_mip = use_mip # if true we use the mip solver instead of the dynamic programming knapsack solver
+        
+        # Transposed distances (first index median) for the vectorized profit computation, created in pricerinit
+        # if the distance matrix is held in memory
+        self.distancesT = None
+        
+        # Dynamic programming knapsack solver shared by the pricing problems of all medians, created in pricerinit
+        self.knapsack = None
+        # Persistent MIP knapsack models, one per median, created when the median is priced for the first time
+        self.mipSolvers = {}
+        
+        # Parallel pricing: None (sequential), 'thread' or 'process'; the MIP knapsack models are always solved sequentially
+        self.parallel = parallel if not use_mip else None
+        self.nworkers = nworkers # number of workers, None for the number of available cores
+        self.parallelPricing = None
+        
+        # Pricing strategy, see PRICING_STRATEGIES, and maximal number of columns added per round (None for no limit)
+        assert strategy in PRICING_STRATEGIES
+        assert strategy == "full" or (maxcolumns is not None and maxcolumns >= 1)
+        self.strategy = strategy
+        self.maxcolumns = maxcolumns if strategy != "full" else None
+        # median the next round-robin sweep starts with
+        self.nextMedian = 0
+        # score (reduced cost or Farkas value) of each median when it was priced the last time
+        self.medianScores = None
+        # did the last pricing round price all medians?
+        self.fullSweep = False
+        # Lagrangian lower bound of the last reduced cost pricing round with a full sweep, None if not available
+        self.lagrangianBound = None
+        
+        # Dual stabilization, see STABILIZATIONS
+        assert stabilization in STABILIZATIONS
+        assert 0.0 <= smoothing < 1.0 and boxwidth > 0.0
+        self.stabilization = stabilization
+        self.smoothing = smoothing
+        self.boxwidth = boxwidth
+        # stability center (assignment duals) and its Lagrangian bound at the node it belongs to
+        self.stabilityCenter = None
+        self.centerBound = None
+        
+        # number of the node priced in the last round
+        self.currentNode = None
+        
+        # Warm start of the children of a node: node number -> NodeState, None if no warm start is used.
+        # At most maxnodestates states are kept, the oldest ones are evicted first.
+        self.nodeStates = {} if nodewarmstart else None
+        self.maxnodestates = maxnodestates
+        
+        # Reduced cost fixing of columns and assignments when the column generation of the root ends with an incumbent
+        self.rootfixing = rootfixing
+        self.rootFixed = False
+        
+        # (median, locations) of columns of heuristic solutions by column_pool.column_key, added to the master in the next
+        # pricing round at a node they are compatible with
+        self.queuedColumns = {}
+        
+        # Assignment duals the first pricing round is performed with instead of the duals of the master LP 
+        # (e.g., the duals of the compact LP, see hybrid_cpmp), None if there are none
+        self.initialDuals = None
+        
+        # Pool of columns found in pricing but not added to the master, None if no pool is used
+        self.columnPool = column_pool.ColumnPool(poolsize, poolage) if columnpool else None
+        
+        # Statistics: number of pricing rounds, of mispricings, of columns taken from the pool, 
+        # of columns added by the warm start of a node, of generated columns that were already in the master, 
+        # of columns and assignments fixed at the root, of columns priced with the initial duals and total time spent in pricing
+        self.npricingrounds = 0
+        self.nmisprices = 0
+        self.npoolcolumns = 0
+        self.nwarmstartcolumns = 0
+        self.nfixedcolumns = 0
+        self.nfixedassignments = 0
+        self.ninitialcolumns = 0
+        self.nduplicates = 0
+        self.pricingtime = 0.0
 
     # 
     # Local methods
     #    
 
-    def isLocationInCluster(self, var, targetlocation):
-        for location in var.data.locations:
-            if location == targetlocation:
-                return True
-            
-        return False
-
+    """Solve the pricing problem of a median with its persistent MIP knapsack model
+    
+    :param median: median to be priced
+    :param items: locations that may be assigned to the median, None for all locations
+    :param profits: profits of these locations
+    :param forced: array of locations that have to be packed
+    :return: list of packed locations
+    """
+    def solveKnapsackMIP(self, median, items, profits, forced):
+        if median not in self.mipSolvers:
+            self.mipSolvers[median] = knapsacksolver.KnapsackMIP(self.demands, self.capacities[median])
+        
+        forcedmask = None
+        if len(forced) > 0:
+            forcedmask = numpy.zeros(self.nlocations, dtype = bool)
+            forcedmask[forced] = True
+        
+        if items is None:
+            return self.mipSolvers[median].solve(profits, forced = forcedmask)
+        
+        # the model contains all locations: locations that are not items are forbidden
+        allprofits = numpy.zeros(self.nlocations)
+        allprofits[items] = profits
+        forbidden = numpy.ones(self.nlocations, dtype = bool)
+        forbidden[items] = False
+        
+        return self.mipSolvers[median].solve(allprofits, forbidden, forcedmask)
 
     """Add a new column to the master problem
      
@@ -77,23 +218,27 @@ class PricerCPMP(Pricer):
     :param sollocations: locations contained in the new cluster
     :param nsollocations: number of locations contained in the new cluser
     :param score: score for the column: either its reduced cost or Farkas value
+    :param pricedVar: False for columns added before the solving process starts (start columns)
     :return: SCIP status
     """
-    def addColumn(self, median, sollocations):
+    def addColumn(self, median, sollocations, pricedVar = True):
         ###########################################################################################
         # TODO: compute the total service costs of the new cluster, to be stored in 'cost' 
         ###########################################################################################
-        cost = sum([self.distances[location, median] for location in sollocations]) # total distances of new generated cluster
+        cost = float(self.distances[sollocations, median].sum()) # total distances of new generated cluster
         
         
         # create a new variable representing the newly found cluster, add the corresponding data and add it to the master problem 
         varName = "Pattern_"+str(median)+"_"+str(self.nVarsMedian[median])
         self.nVarsMedian[median] = self.nVarsMedian[median]+1
 
+        # The upper bound 1 is implied by the convexity constraint of the median and not set explicitly: a column at an
+        # explicit upper bound can have a negative reduced cost with respect to the duals of the master constraints,
+        # such that the knapsack of its median returns the column again instead of a new improving one.
         if self.solveinteger:
-            newVar = self.model.addVar(varName, vtype = 'B', obj=cost, lb = 0.0, ub=1.0, pricedVar = True)
+            newVar = self.model.addVar(varName, vtype = 'I', obj=cost, lb = 0.0, ub=None, pricedVar = pricedVar)
         else:
-            newVar = self.model.addVar(varName, vtype = 'C', obj=cost, lb = 0.0, ub=1.0, pricedVar = True)
+            newVar = self.model.addVar(varName, vtype = 'C', obj=cost, lb = 0.0, ub=None, pricedVar = pricedVar)
     
         ###########################################################################################
         # TODO: add the variable newVar to the master constraints:
@@ -112,124 +257,587 @@ class PricerCPMP(Pricer):
             self.model.addConsCoeff(cons, newVar, -1)
         
 
-        newVar.data = PatternVarData(median, sollocations)
+        locations = numpy.array(sorted(sollocations), dtype = numpy.int32)
+        newVar.data = PatternVarData(median, locations, self.columnStore.add(median, locations))
         self.patternVars.append(newVar)
+        key = column_pool.column_key(median, sollocations)
+        self.columnVars[key] = newVar
+        if self.columnPool is not None:
+            self.columnPool.remove(key)
         self.nvars += 1
         
         return {'result':SCIP_RESULT.SUCCESS}
     
+    """Add the columns of a solution to the master problem, columns already in the master are not added again
     
-    """Call the pricing routine
+    :param clusters: list of (median, locations) of the solution
+    :param pricedVar: False if the solving process has not started yet
+    :return: list of the variables of the clusters
+    """
+    def addSolution(self, clusters, pricedVar = True):
+        solvars = []
+        for median, locations in clusters:
+            key = column_pool.column_key(median, locations)
+            if key not in self.columnVars:
+                self.addColumn(median, list(locations), pricedVar)
+            solvars.append(self.columnVars[key])
+        
+        return solvars
     
-    Method called by the callback methods pricerredcost and pricerfarkas 
-    with appropriate value of the redcostpricing flag
+    """Queue the columns of a heuristic solution; variables can only be added to the master during pricing
     
-    :param redcostpricing: True (resp. False) if method is called by the pricerredcost (resp. pricerfarkas) callback 
+    :param clusters: list of (median, locations) of the solution
     """
-    def performPricing(self, redcostpricing = False):
-        for median in range(self.nlocations):           
-            # Array of items in the knapsack problem
-            items = []
-            # Array of item profits
-            profits = []
-            # Array of item demands
-            itemDemands = []
-            
-            ################################################################################################
-            # TODO: prepare the knapsack problem for the current pricing problem:
-            # store the possible locations as items, get their demands and calculate their profits;
-            #
-            # NOTE: Due to branching restrictions, not all locations are added as items, so you
-            # need to check the forbiddenassignments data structure here. Have a look at the methods at 
-            # the end of this file.
-            #
-            # NOTE: The profits depend on whether you do reduced cost pricing or Farkas pricing!!
-            ################################################################################################
-            
-            for location in range(self.nlocations):
-                if not self.isAssignmentForbidden(median, location):
-                    items.append(location)
-                    itemDemands.append(self.demands[location])
-
-                    if redcostpricing == True: # reduced cost pricing
-                        profits.append(-self.model.getDualsolLinear(self.assignmentConss[location]) - self.distances[(location, median)])
-                    else: # Farkas
-                        profits.append(-self.model.getDualfarkasLinear(self.assignmentConss[location]))
-
+    def queueColumns(self, clusters):
+        for median, locations in clusters:
+            key = column_pool.column_key(median, locations)
+            if key not in self.columnVars:
+                self.queuedColumns[key] = (median, locations)
+    
+    """Set the assignment duals of the first pricing round, they are also the first stability center
+    
+    :param assignmentDuals: nonpositive dual values of the assignment constraints, e.g., of the compact LP
+    """
+    def setInitialDuals(self, assignmentDuals):
+        self.initialDuals = assignmentDuals
+        if self.stabilization is not None:
+            self.stabilityCenter = assignmentDuals
+    
+    """Price all medians with the initial duals, the convexity and p-median duals being zero
+    
+    :return: list of (median, locations) of the columns with negative reduced cost that are not in the master yet
+    """
+    def initialColumns(self):
+        assignmentDuals = self.initialDuals
+        medians = numpy.arange(self.nlocations)
+        profits = self.computeProfits(assignmentDuals, True)
+        packings = list(zip(medians, self.solveKnapsacks(medians, profits, assignmentDuals, True)))
+        scores = self.computeScores(packings, assignmentDuals, numpy.zeros(self.nlocations), 0.0, True)
+        
+        return [(median, packed_items) for (median, packed_items), score in zip(packings, scores) 
+                if score < 0 - EPS and column_pool.column_key(median, packed_items) not in self.columnVars]
+    
+    """Keep a column that is not added to the master in the column pool
+    
+    :param median: median of the column
+    :param locations: locations of the column
+    """
+    def poolColumn(self, median, locations):
+        if self.columnPool is None:
+            return
+        
+        key = column_pool.column_key(median, locations)
+        if key not in self.columnVars:
+            self.columnPool.add(key, float(self.distances[list(key[1]), median].sum()))
+    
+    
+    """Fetch the dual values of all master constraints
+    
+    :param redcostpricing: True for the LP dual solution, False for the Farkas multipliers
+    :return: array of assignment duals, array of convexity duals, p-median dual
+    """
+    def fetchDuals(self, redcostpricing):
+        getDual = self.model.getDualsolLinear if redcostpricing else self.model.getDualfarkasLinear
+        
+        assignmentDuals = numpy.fromiter((getDual(cons) for cons in self.assignmentConss), dtype = float, count = self.nlocations)
+        convexityDuals = numpy.fromiter((getDual(cons) for cons in self.convexityConss), dtype = float, count = self.nlocations)
+        pmedianDual = getDual(self.pmedianCons)
+        
+        return assignmentDuals, convexityDuals, pmedianDual
+    
+    """Compute the profits of all pricing problems at once
+    
+    :param assignmentDuals: dual values of the assignment constraints
+    :param redcostpricing: True for reduced cost pricing, False for Farkas pricing
+    :return: profit matrix, first index median, second index location; forbidden and forced assignments have profit 0,
+             i.e., they are never packed by the knapsack solver. None if the distances are only read per median 
+             (streaming or candidates).
+    """
+    def computeProfits(self, assignmentDuals, redcostpricing):
+        if self.distancesT is None:
+            return None
+        
+        # with parallel pricing, the profits are written into the matrix shared with the workers
+        profits = self.parallelPricing.profits if self.parallelPricing is not None else None
+        if profits is None:
+            profits = numpy.empty((self.nlocations, self.nlocations))
+        if redcostpricing:
+            numpy.subtract(-assignmentDuals[None, :], self.distancesT, out = profits)
+        else:
+            profits[:] = -assignmentDuals[None, :]
+        profits[self.forbiddenassignments] = 0.0
+        if self.nforced > 0:
+            profits[self.forcedassignments] = 0.0
+        
+        return profits
+    
+    """Items and profits of the pricing problem of a median
+    
+    :param median: median to be priced
+    :param profits: profit matrix of computeProfits, or None
+    :param assignmentDuals: dual values of the assignment constraints
+    :param redcostpricing: True for reduced cost pricing, False for Farkas pricing
+    :return: array of items (None if all locations are items) and their profits
+    """
+    def medianItems(self, median, profits, assignmentDuals, redcostpricing):
+        if profits is not None:
+            return None, profits[median]
+        
+        items = self.allowedItems(median)
+        itemProfits = -assignmentDuals[items]
+        if redcostpricing:
+            itemProfits -= self.distances[items, median]
+        
+        return items, itemProfits
+    
+    """Lagrangian bound of the master problem for the current assignment duals
+    
+    Relaxing the assignment constraints with multipliers u = -assignmentDuals, the Lagrangian subproblem decomposes
+    into the pricing problems: at most one pattern per median and at most p patterns overall. Its value is
+    sum(u) plus the sum of the p smallest values min(0, -knapsackvalue(m)).
+    Requires the scores of the current round for all medians, i.e., a full sweep.
+    
+    :param assignmentDuals: dual values of the assignment constraints
+    :param convexityDuals: dual values of the convexity constraints
+    :param pmedianDual: dual value of the p-median constraint
+    :return: lower bound on the objective value of the master problem at the current node
+    """
+    def computeLagrangianBound(self, assignmentDuals, convexityDuals, pmedianDual):
+        # score(m) = -knapsackvalue(m) - convexityDual(m) - pmedianDual
+        knapsackValues = -(self.medianScores + convexityDuals + pmedianDual)
+        contributions = numpy.sort(numpy.minimum(0.0, -knapsackValues))
+        
+        return float(-assignmentDuals.sum() + contributions[:self.nclusters].sum())
+    
+    """Solve the Lagrangian relaxation of the assignment constraints
+    
+    :param multipliers: nonnegative Lagrangian multipliers, i.e., negated assignment duals
+    :return: Lagrangian bound and list of (median, packed locations) of the chosen patterns
+    """
+    def lagrangianRelaxation(self, multipliers):
+        assignmentDuals = -multipliers
+        medians = numpy.arange(self.nlocations)
+        profits = self.computeProfits(assignmentDuals, True)
+        packings = list(zip(medians, self.solveKnapsacks(medians, profits, assignmentDuals, True)))
+        
+        # the reduced costs without convexity and p-median duals are the negated knapsack values
+        scores = self.computeScores(packings, assignmentDuals, numpy.zeros(self.nlocations), 0.0, True)
+        chosen = [median for median in numpy.argsort(scores, kind = "stable")[:self.nclusters] if scores[median] < 0]
+        
+        return float(multipliers.sum() + scores[chosen].sum()), [packings[median] for median in chosen]
+    
+    """Lagrangian bound after a few subgradient steps, e.g., to estimate the bound of a child node
+    
+    :param assignmentDuals: dual values of the assignment constraints to start from
+    :param nsteps: number of subgradient steps
+    :param target: target value of the Polyak step size, should be an upper bound
+    :return: best Lagrangian bound of all steps
+    """
+    def subgradientBound(self, assignmentDuals, nsteps, target):
+        multipliers = numpy.maximum(-assignmentDuals, 0.0)
+        bestbound = -self.model.infinity()
+        
+        for _ in range(nsteps):
+            bound, patterns = self.lagrangianRelaxation(multipliers)
+            bestbound = max(bestbound, bound)
             
+            # subgradient of the relaxed covering constraints: 1 - number of chosen patterns containing the location
+            subgradient = numpy.ones(self.nlocations)
+            for _, packed in patterns:
+                subgradient[packed] -= 1.0
+            norm = subgradient @ subgradient
+            if bound >= target or norm <= EPS:
+                break
             
-            ####################################################################################################
-            # TODO: Prepare the data for the ortools knapsack solver. You have to consider the following points:
-            # * The expected data format is as in the following artificialexample: 
-            #      profits = [7 5 2 5 2 3]  -> a vector containing the profits of the items
-            #      weights = [[10 12 13 15 16]] -> a vector containing the weights of the items
-            #      capacities = [[23]]-> a vector with just one entry, the capacity of the knapsack
-            # (See also description here: https://developers.google.com/optimization/bin/knapsack)
-            # * The ortools solver can only handle integer profits and weights. Are your profits and weights 
-            #   always integer? If not, how can you handle this?
-            ####################################################################################################
+            multipliers = numpy.maximum(multipliers + (target - bound) / norm * subgradient, 0.0)
+        
+        return bestbound
+    
+    """Stabilized assignment duals used in reduced cost pricing
+    
+    :param assignmentDuals: dual values of the assignment constraints in the master LP
+    :return: stabilized dual values (all nonpositive, as the duals of the master LP)
+    """
+    def stabilizedDuals(self, assignmentDuals):
+        if self.stabilization is None or self.stabilityCenter is None:
+            return assignmentDuals
+        
+        if self.stabilization == "wentges":
+            return self.smoothing * self.stabilityCenter + (1.0 - self.smoothing) * assignmentDuals
+        
+        width = self.boxwidth * numpy.abs(self.stabilityCenter).mean()
+        return numpy.clip(assignmentDuals, self.stabilityCenter - width, self.stabilityCenter + width)
+    
+    """Move the stability center to the pricing duals of this round if they improve the Lagrangian bound
+    
+    :param pricingDuals: assignment duals the round was priced with
+    :param bound: their Lagrangian bound, None if the round did not price all medians
+    """
+    def updateStabilityCenter(self, pricingDuals, bound):
+        if bound is None:
+            # without bound, e.g., with a partial pricing strategy, the center follows the pricing duals
+            self.stabilityCenter = pricingDuals
+        elif self.centerBound is None or bound > self.centerBound:
+            self.stabilityCenter = pricingDuals
+            self.centerBound = bound
+    
+    """Prepare the pricing of a node that is priced for the first time
+    
+    The Lagrangian bounds of different nodes are not comparable: the stability center is kept (or taken from the parent, 
+    if its state is known), its bound is recomputed.
+    
+    :param node: current node
+    :return: state of the parent node, None if unknown
+    """
+    def enterNode(self, node):
+        self.currentNode = node.getNumber()
+        self.centerBound = None
+        
+        parent = node.getParent()
+        if self.nodeStates is None or parent is None:
+            return None
+        
+        state = self.nodeStates.get(parent.getNumber())
+        if state is not None and self.stabilization is not None:
+            self.stabilityCenter = state.center
+        return state
+    
+    """Save the pricing state of the current node at the end of its column generation
+    
+    :param pricingDuals: assignment duals the last round was priced with
+    :param pending: list of (median, locations) of improving columns that were not added
+    """
+    def saveNodeState(self, pricingDuals, pending):
+        values = numpy.fromiter((var.getLPSol() for var in self.patternVars), dtype = float, count = self.nvars)
+        support = [(var.data.median, var.data.locations) for var, value in zip(self.patternVars, values) if value > EPS]
+        center = self.stabilityCenter if self.stabilityCenter is not None else pricingDuals
+        
+        self.nodeStates.pop(self.currentNode, None)
+        self.nodeStates[self.currentNode] = NodeState(center, support, pending)
+        while len(self.nodeStates) > self.maxnodestates:
+            del self.nodeStates[next(iter(self.nodeStates))]
+    
+    """Check whether a column is compatible with the forbidden and forced assignments of the current node"""
+    def isColumnCompatible(self, median, locations):
+        locations = numpy.asarray(locations, dtype = numpy.int64)
+        if self.forbiddenassignments[median, locations].any():
+            return False
+        return self.nforced == 0 or numpy.isin(numpy.flatnonzero(self.forcedassignments[median]), locations).all()
+    
+    """Make a column compatible with the forbidden and forced assignments of the current node
+    
+    :param median: median of the column
+    :param locations: locations of the column
+    :return: array of the locations of the repaired column, None if the forced locations do not fit
+    """
+    def repairColumn(self, median, locations):
+        locations = numpy.asarray(locations, dtype = numpy.int64)
+        locations = locations[~self.forbiddenassignments[median, locations]]
+        if self.nforced > 0:
+            locations = numpy.union1d(locations, numpy.flatnonzero(self.forcedassignments[median]))
+            if self.demands[locations].sum() > self.capacities[median]:
+                return None
+        return locations
+    
+    """Columns of the parent node adapted to the current node: the improving columns the parent did not add and the 
+    columns of its final LP solution, whose assignments forbidden at this node are dropped
+    
+    :param state: pricing state of the parent node
+    :param assignmentDuals: dual values of the assignment constraints
+    :param convexityDuals: dual values of the convexity constraints
+    :param pmedianDual: dual value of the p-median constraint
+    :param redcostpricing: True for reduced costs, False for Farkas values
+    :return: list of (median, locations) of new columns with negative score
+    """
+    def warmStartColumns(self, state, assignmentDuals, convexityDuals, pmedianDual, redcostpricing):
+        candidates = {}
+        for median, locations in state.pending + state.support:
+            repaired = self.repairColumn(median, locations)
+            if repaired is None or len(repaired) == 0:
+                continue
+            key = column_pool.column_key(median, repaired)
+            if key not in self.columnVars:
+                candidates[key] = (median, repaired)
+        
+        columns = list(candidates.values())
+        scores = self.computeScores(columns, assignmentDuals, convexityDuals, pmedianDual, redcostpricing)
+        return [column for column, score in zip(columns, scores) if score < 0 - EPS]
+    
+    """Reduced cost fixing at the root
+    
+    With the assignment duals as Lagrangian multipliers, every assignment gets a lower bound on the value of the solutions
+    containing it (see preprocess_cpmp.lagrangian_fixing). The assignments that are not part of any solution better than
+    the incumbent are forbidden in the whole tree, and the columns containing them are fixed to zero, except the columns
+    of the incumbent. Columns are only fixed by their assignments: the knapsacks never pack a forbidden assignment, such
+    that a fixed column cannot be generated again (and rejected as a duplicate) in pricing.
+    
+    :param assignmentDuals: dual values of the assignment constraints of the final root LP
+    """
+    def rootReducedCostFixing(self, assignmentDuals):
+        multipliers = numpy.maximum(-assignmentDuals, 0.0)
+        upperbound = self.model.getPrimalbound()
+        
+        forbidden = self.forbiddenassignments.copy()
+        preprocess_cpmp.lagrangian_fixing(self.distances, self.demands, self.capacities, self.nclusters, multipliers, upperbound, 
+                                          forbidden, self.solveinteger)
+        
+        fixed = forbidden & ~self.forbiddenassignments
+        for location in numpy.flatnonzero(fixed.any(axis = 0)):
+            self.forbidAssignmentsGlobally(location, fixed[:, location])
+        self.nfixedassignments += int(fixed.sum())
+        
+        containsFixed = (self.columnStore.membership[:self.nvars] & fixed[self.columnStore.medians[:self.nvars]]).any(axis = 1)
+        incumbent = self.model.getBestSol()
+        for i in numpy.flatnonzero(containsFixed):
+            var = self.patternVars[i]
+            if var.getUbGlobal() > 0.5 and self.model.getSolVal(incumbent, var) < 0.5:
+                self.model.chgVarUbGlobal(var, 0.0)
+                self.nfixedcolumns += 1
+    
+    """Order in which the medians are priced in this round, according to the pricing strategy"""
+    def pricingOrder(self):
+        if self.strategy == "roundrobin":
+            return numpy.roll(numpy.arange(self.nlocations), -self.nextMedian)
+        if self.strategy == "priority":
+            return numpy.argsort(self.medianScores, kind = "stable")
+        return numpy.arange(self.nlocations)
+    
+    """Solve the pricing problems of some medians
+    
+    :param medians: medians to be priced
+    :param profits: profit matrix of computeProfits, or None
+    :param assignmentDuals: dual values of the assignment constraints
+    :param redcostpricing: True for reduced cost pricing, False for Farkas pricing
+    :return: list of arrays of packed locations, in the order of the medians; 
+             None for a median whose forced locations exceed its capacity
+    """
+    def solveKnapsacks(self, medians, profits, assignmentDuals, redcostpricing):
+        # forced locations are packed in advance, the knapsack is solved for the remaining capacity
+        noforced = numpy.zeros(0, dtype = numpy.int64)
+        forced = [numpy.flatnonzero(self.forcedassignments[median]) if self.nforced > 0 else noforced for median in medians]
+        
+        tasks = []
+        for median, medianForced in zip(medians, forced):
+            items, medianProfits = self.medianItems(median, profits, assignmentDuals, redcostpricing)
+            tasks.append((items, medianProfits, self.capacities[median] - self.demands[medianForced].sum()))
+        feasible = [capacity >= 0 for _, _, capacity in tasks]
+        
+        if self.use_mip:
+            # the MIP knapsack models contain all locations and pack the forced locations themselves
+            return [self.solveKnapsackMIP(median, items, medianProfits, medianForced) if isfeasible else None
+                    for median, (items, medianProfits, _), medianForced, isfeasible in zip(medians, tasks, forced, feasible)]
+        
+        if self.parallelPricing is not None and profits is not None and profits is self.parallelPricing.profits:
+            # the workers read the profits from the shared matrix, only the medians and capacities are sent
+            solved = iter(self.parallelPricing.solveMedians([(median, capacity) for median, (_, _, capacity), isfeasible 
+                                                             in zip(medians, tasks, feasible) if isfeasible]))
+            packings = [next(solved) if isfeasible else None for isfeasible in feasible]
+        elif self.parallelPricing is not None:
+            solved = iter(self.parallelPricing.solve([task for task, isfeasible in zip(tasks, feasible) if isfeasible]))
+            packings = [next(solved) if isfeasible else None for isfeasible in feasible]
+        else:
+            packings = [self.knapsack.solve(medianProfits, capacity, items)[0] if isfeasible else None
+                        for (items, medianProfits, capacity), isfeasible in zip(tasks, feasible)]
+        
+        return [packed if packed is None or len(medianForced) == 0 else numpy.sort(numpy.concatenate((medianForced, packed)))
+                for packed, medianForced in zip(packings, forced)]
+    
+    """Compute the reduced costs (or Farkas values) of packed columns
+    
+    :param packings: list of (median, array of packed locations or None for an infeasible pricing problem)
+    :param assignmentDuals: dual values of the assignment constraints
+    :param convexityDuals: dual values of the convexity constraints
+    :param pmedianDual: dual value of the p-median constraint
+    :param redcostpricing: True for reduced costs, False for Farkas values
+    :return: array with one score per packing, infinity for infeasible pricing problems
+    """
+    def computeScores(self, packings, assignmentDuals, convexityDuals, pmedianDual, redcostpricing):
+        if not packings:
+            return numpy.zeros(0)
+        
+        infeasible = [k for k, (_, packed) in enumerate(packings) if packed is None]
+        if infeasible:
+            packings = [(median, [] if packed is None else packed) for median, packed in packings]
+        
+        medians = numpy.fromiter((median for median, _ in packings), dtype = numpy.int64, count = len(packings))
+        sizes = numpy.fromiter((len(packed) for _, packed in packings), dtype = numpy.int64, count = len(packings))
+        locations = numpy.concatenate([numpy.asarray(packed, dtype = numpy.int64) for _, packed in packings])
+        columns = numpy.repeat(numpy.arange(len(packings)), sizes)
+        
+        contributions = assignmentDuals[locations]
+        if redcostpricing:
+            contributions = contributions + self.distances[locations, medians[columns]]
+        
+        scores = numpy.bincount(columns, weights = contributions, minlength = len(packings))
+        scores = scores - pmedianDual - convexityDuals[medians]
+        scores[infeasible] = numpy.inf
+        
+        return scores
+    
+    """Solve the pricing problems of the medians in the order of the pricing strategy
+    
+    The pricing problems are set up with the pricing duals, the columns are evaluated with the duals of the master LP.
+    
+    :param pricingDuals: assignment duals the knapsack profits are computed with
+    :param assignmentDuals: dual values of the assignment constraints
+    :param convexityDuals: dual values of the convexity constraints
+    :param pmedianDual: dual value of the p-median constraint
+    :param redcostpricing: True for reduced cost pricing, False for Farkas pricing
+    :return: list of (median, packed locations) with negative score
+    """
+    def priceMedians(self, pricingDuals, assignmentDuals, convexityDuals, pmedianDual, redcostpricing):
+        # the profit of location l for median m is -dual(l) - distance(l, m) (reduced cost pricing) or -farkas(l);
+        # forbidden assignments are never packed
+        profits = self.computeProfits(pricingDuals, redcostpricing)
+        
+        order = self.pricingOrder()
+        if self.maxcolumns is None:
+            chunksize = self.nlocations
+        else:
+            # with a column limit, the medians are priced in small chunks to be able to stop early
+            chunksize = self.parallelPricing.nworkers if self.parallelPricing is not None else 1
+        
+        npriced = 0
+        columns = []
+        while npriced < len(order) and (self.maxcolumns is None or len(columns) < self.maxcolumns):
+            medians = order[npriced:npriced + chunksize]
+            npriced += len(medians)
             
-            # These are the names of the variables used in knapsackSolver.Init() below, feel free to remove 
-            # this initialization if necessary
-            myItems = []
-            profitsSolver = []
-            weightsSolver = [[]]
-            capacitiesSolver = [self.capacities[median]]
+            packings = list(zip(medians, self.solveKnapsacks(medians, profits, pricingDuals, redcostpricing)))
             
-            if self.use_mip:
-                packed_items = knapsacksolver.solve(profits, itemDemands, self.capacities[median])
-                packed_items = [items[i] for i in packed_items] # re-project to original item / location ids
+            # the scores with respect to the pricing duals give the Lagrangian bound, 
+            # a column is added if its reduced cost (resp. Farkas value) is negative
+            self.medianScores[medians] = self.computeScores(packings, pricingDuals, convexityDuals, pmedianDual, redcostpricing)
+            if pricingDuals is assignmentDuals:
+                scores = self.medianScores[medians]
             else:
-                for i in range(len(items)):
-                    if profits[i] > EPS:
-                        profitsSolver.append(int(math.ceil(profits[i] / EPS))) # divide by eps to get eps precision as integer
-                        weightsSolver[0].append(itemDemands[i])
-                        myItems.append(items[i]) # add the associated location for reprojection
-
-                # initialize the ortools Knapsack solver
-                knapsackSolver = pywrapknapsack_solver.KnapsackSolver(pywrapknapsack_solver.KnapsackSolver.KNAPSACK_DYNAMIC_PROGRAMMING_SOLVER, 'KnapsackExample')
-                knapsackSolver.Init(profitsSolver,weightsSolver,capacitiesSolver)
-                # solve the subproblem
-                computed_value = knapsackSolver.Solve()
-
-                # gather the results from the ortools Knapsack solver
-                packed_items = [myItems[i] for i in range(len(profitsSolver)) if knapsackSolver.BestSolutionContains(i)]
-
-            ####################################################################################################
-            # TODO: now that a column has been calculated, 
-            # 1) calculate its reduced cost or Farkas coefficient (to be stored in 'score'); 
-            # 2) check whether it can be added (i.e., replace the "True" in the "if" below by an appropriate condition) 
-            # 3) if the column can be added use the addColumn()
-            # method to add it to the master problem (this point is implemented already.)
-            ####################################################################################################
-            
-            score = 0
-
-            if redcostpricing == True: # reduced cost pricing
-                score += sum([self.model.getDualsolLinear(self.assignmentConss[location]) for location in packed_items])
-                score += sum([self.distances[location, median] for location in packed_items])
-                score -= self.model.getDualsolLinear(self.pmedianCons)
-                score -= self.model.getDualsolLinear(self.convexityConss[median])
-            else: # farkas 
-                score += sum([self.model.getDualfarkasLinear(self.assignmentConss[location]) for location in packed_items])
-                score -= self.model.getDualfarkasLinear(self.pmedianCons)
-                score -= self.model.getDualfarkasLinear(self.convexityConss[median])
-                
-            if score < 0 - EPS:
-                self.addColumn(median, packed_items)
-            
-            #print("{0} of {1} have been priced.".format(median + 1, self.nlocations))
-            
-            ####################################################################################################
-            # TODO: (AT THE END OF THE EXERCISE, FOR THE ANALYSIS PART OF THE REPORT)
-            # -> We have solved the subproblem using an efficient Knapsack solver from ortools. 
-            #    Implement a different approach to solve the subproblems. What happens if you solve the 
-            #    subproblems for example as a MIP? Is the performance better, worse, or maybe it does not change?
-            ####################################################################################################
+                scores = self.computeScores(packings, assignmentDuals, convexityDuals, pmedianDual, redcostpricing)
+            for (median, packed_items), score, pricingScore in zip(packings, scores, self.medianScores[medians]):
+                if score < 0 - EPS and (self.maxcolumns is None or len(columns) < self.maxcolumns):
+                    columns.append((median, packed_items))
+                elif score < 0 - EPS or pricingScore < 0 - EPS:
+                    # improving, but beyond the column limit or only for the stabilized duals: kept for later rounds
+                    self.poolColumn(median, packed_items)
+        
+        self.fullSweep = npriced == len(order)
+        if self.strategy == "roundrobin":
+            self.nextMedian = int(order[npriced - 1] + 1) % self.nlocations
+        
+        return columns
+    
+    """Call the pricing routine
+    
+    Method called by the callback methods pricerredcost and pricerfarkas 
+    with appropriate value of the redcostpricing flag
+    
+    :param redcostpricing: True (resp. False) if method is called by the pricerredcost (resp. pricerfarkas) callback 
+    """
+    def performPricing(self, redcostpricing = False):
+        starttime = time.perf_counter()
+        self.npricingrounds += 1
+        
+        # columns of heuristic solutions are added regardless of their score, but only at a node whose branching decisions
+        # they respect: the branching constraints do not propagate the columns added while their node is priced, such
+        # that an incompatible column could take a positive value; it stays queued for a later node
+        if self.queuedColumns:
+            compatible = [key for key, column in self.queuedColumns.items() if self.isColumnCompatible(*column)]
+            self.addSolution([self.queuedColumns.pop(key) for key in compatible])
+        
+        # the first round prices with the initial duals instead of the (Farkas) duals of the master LP
+        if self.initialDuals is not None:
+            columns = self.initialColumns()
+            self.initialDuals = None
+            if columns:
+                self.ninitialcolumns += len(columns)
+                for median, packed_items in columns:
+                    self.addColumn(median, [int(location) for location in packed_items])
+                self.pricingtime += time.perf_counter() - starttime
+                return {'result':SCIP_RESULT.SUCCESS}
+        
+        # all duals are fetched once per round
+        assignmentDuals, convexityDuals, pmedianDual = self.fetchDuals(redcostpricing)
+        
+        # the first round of a node starts with the columns of its parent that are compatible with the node
+        node = self.model.getCurrentNode()
+        if node.getNumber() != self.currentNode:
+            state = self.enterNode(node)
+            if state is not None:
+                columns = self.warmStartColumns(state, assignmentDuals, convexityDuals, pmedianDual, redcostpricing)
+                if columns:
+                    self.nwarmstartcolumns += len(columns)
+                    for median, locations in columns:
+                        self.addColumn(median, [int(location) for location in locations])
+                    self.pricingtime += time.perf_counter() - starttime
+                    return {'result':SCIP_RESULT.SUCCESS}
+        
+        # columns of the pool are cheaper than any knapsack: if the pool yields improving columns, the round ends here
+        if self.columnPool is not None:
+            forced = self.forcedassignments if self.nforced > 0 else None
+            found = self.columnPool.scan(assignmentDuals, convexityDuals, pmedianDual, self.forbiddenassignments, redcostpricing, self.maxcolumns, forced)
+            if found:
+                self.npoolcolumns += len(found)
+                for (median, locations), _ in found:
+                    self.addColumn(median, list(locations))
+                self.pricingtime += time.perf_counter() - starttime
+                return {'result':SCIP_RESULT.SUCCESS}
+        
+        pricingDuals = self.stabilizedDuals(assignmentDuals) if redcostpricing else assignmentDuals
+        columns = self.priceMedians(pricingDuals, assignmentDuals, convexityDuals, pmedianDual, redcostpricing)
+        
+        result = {'result':SCIP_RESULT.SUCCESS}
+        
+        # after a full sweep of reduced cost pricing, the exact pricing values give a Lagrangian bound for the node,
+        # also for stabilized duals
+        self.lagrangianBound = None
+        if redcostpricing and self.fullSweep:
+            self.lagrangianBound = self.computeLagrangianBound(pricingDuals, convexityDuals, pmedianDual)
+        
+        if redcostpricing and self.stabilization is not None:
+            self.updateStabilityCenter(pricingDuals, self.lagrangianBound)
             
+            # mispricing: the stabilized duals do not yield an improving column, the round is repeated with the LP duals
+            if not columns and pricingDuals is not assignmentDuals:
+                self.nmisprices += 1
+                columns = self.priceMedians(assignmentDuals, assignmentDuals, convexityDuals, pmedianDual, redcostpricing)
+                if self.fullSweep:
+                    bound = self.computeLagrangianBound(assignmentDuals, convexityDuals, pmedianDual)
+                    self.updateStabilityCenter(assignmentDuals, bound)
+                    self.lagrangianBound = bound if self.lagrangianBound is None else max(self.lagrangianBound, bound)
+        
+        # since the objective is integral, column generation can stop as soon as the rounded bound reaches the LP value
+        pending = []
+        if self.lagrangianBound is not None:
+            result['lowerbound'] = self.lagrangianBound
             
-                
-        return {'result':SCIP_RESULT.SUCCESS}
+            if self.solveinteger and columns and self.model.isGE(self.model.feasCeil(self.lagrangianBound), self.model.getLPObjVal()):
+                for median, packed_items in columns:
+                    self.poolColumn(median, packed_items)
+                pending = columns
+                columns = []
+                result['stopearly'] = True
+        
+        # the column generation of the node ends, its state is kept for its children
+        if self.nodeStates is not None and redcostpricing and not columns:
+            self.saveNodeState(pricingDuals, pending)
+        
+        # the column generation of the root ends: reduced cost fixing with respect to the incumbent
+        if (self.rootfixing and not self.rootFixed and redcostpricing and not columns and self.model.getDepth() == 0 
+                and not self.model.isInfinity(self.model.getPrimalbound())):
+            self.rootFixed = True
+            self.rootReducedCostFixing(assignmentDuals)
+        
+        for median, packed_items in columns:
+            # a column is never added twice: without an upper bound, the reduced cost of a column in the master is 
+            # nonnegative (up to the LP tolerance) unless the column is fixed to zero at the node, and the pricing 
+            # problems exclude the columns fixed by branching
+            if column_pool.column_key(median, packed_items) in self.columnVars:
+                self.nduplicates += 1
+                continue
+            self.addColumn(median, [int(location) for location in packed_items])
+        
+        self.pricingtime += time.perf_counter() - starttime
+        
+        return result
     
     #
     # Callback methods of variable pricer
@@ -237,8 +845,7 @@ class PricerCPMP(Pricer):
     
     """Reduced cost pricing method of variable pricer for feasible LPs"""
     def pricerredcost(self):
-        self.performPricing(redcostpricing = True)                
-        return {'result':SCIP_RESULT.SUCCESS}
+        return self.performPricing(redcostpricing = True)
     
     """Farkas pricing method of variable pricer for infeasible LPs"""
     def pricerfarkas(self):        
@@ -253,39 +860,120 @@ class PricerCPMP(Pricer):
             self.convexityConss[i] = self.model.getTransformedCons(c)
         
         self.pmedianCons = self.model.getTransformedCons(self.pmedianCons)
+        
+        # start columns have been added to the original problem
+        for i, var in enumerate(self.patternVars):
+            transvar = self.model.getTransformedVar(var)
+            transvar.data = var.data
+            self.patternVars[i] = transvar
+            self.columnVars[column_pool.column_key(var.data.median, var.data.locations)] = transvar
+        
+        # the profits of all medians are computed at once if the distances are held in memory
+        if self.candidates is None and not isinstance(self.distances, numpy.memmap):
+            self.distancesT = numpy.ascontiguousarray(self.distances.T, dtype = float)
+        
+        self.medianScores = numpy.zeros(self.nlocations)
+        
+        # all pricing problems share the item weights, only the capacities differ
+        self.knapsack = knapsack_dp.KnapsackDP(self.demands, self.capacities.max())
+        if self.parallel is not None:
+            self.parallelPricing = parallel_pricing.ParallelPricing(self.demands, self.capacities.max(), self.parallel, self.nworkers,
+                                                                    profitmatrix = self.distancesT is not None)
+    
+    """Solving process deinitialization method of variable pricer (called before branch and bound process data is freed)"""
+    def pricerexitsol(self):
+        if self.parallelPricing is not None:
+            self.parallelPricing.close()
+            self.parallelPricing = None
      
     #
     # Variable pricer specific interface methods
     #  
     
-    """forbid assignments for a certain location"""
-    def forbidAssignments(self, location, forbidden):
+    """forbid assignments for a certain location
+    
+    An assignment stays forbidden until it is allowed as often as it has been forbidden.
+    
+    :param location: location
+    :param medians: array of the medians the location may not be assigned to (or a boolean mask over the medians)
+    """
+    def forbidAssignments(self, location, medians):
         assert location >= 0 and location < self.nlocations
-        for median in range(self.nlocations):
-            if (forbidden[median]):
-                assert forbidden[median] >= 0 and forbidden[median] < self.nlocations
-                self.forbiddenassignments[median,location] = True
+        medians = self.medianIndices(medians)
+        self.forbiddencounts[medians, location] += 1
+        self.forbiddenassignments[medians, location] = True
     
     """forbid assignments of a certain location to a certain median"""
     def forbidAssignment(self,median,location):
         assert median >= 0 and median < self.nlocations
-        assert location >= 0 and location < self.nlocations
-        self.forbiddenassignments[median,location] = True
+        self.forbidAssignments(location, [median])
+    
+    """forbid assignments for a certain location in the whole tree, e.g., after preprocessing; they are never allowed again"""
+    def forbidAssignmentsGlobally(self, location, medians):
+        medians = self.medianIndices(medians)
+        medians = medians[~self.globalforbidden[medians, location]]
+        self.globalforbidden[medians, location] = True
+        self.forbidAssignments(location, medians)
         
-    """allow previously forbidden assignments for a certain location"""
-    def allowAssignments(self, location, forbidden):
+    """allow previously forbidden assignments for a certain location
+    
+    :param location: location
+    :param medians: array of the medians given when forbidding the assignments (or a boolean mask over the medians)
+    """
+    def allowAssignments(self, location, medians):
         assert location >= 0 and location < self.nlocations
-        for median in range(self.nlocations):
-            if (forbidden[median]):
-                assert forbidden[median] >= 0 and forbidden[median] < self.nlocations
-                self.forbiddenassignments[median,location] = False
+        medians = self.medianIndices(medians)
+        assert (self.forbiddencounts[medians, location] > 0).all()
+        self.forbiddencounts[medians, location] -= 1
+        self.forbiddenassignments[medians, location] = self.forbiddencounts[medians, location] > 0
     
     """allow assignments for a certain location"""
     def allowAssignment(self,median,location):
         assert median >= 0 and median < self.nlocations
-        assert location >= 0 and location < self.nlocations
-        self.forbiddenassignments[median,location] = False
+        self.allowAssignments(location, [median])
+    
+    """array of median indices from an array of medians or a boolean mask over all medians"""
+    def medianIndices(self, medians):
+        medians = numpy.asarray(medians)
+        if medians.dtype == bool:
+            assert len(medians) == self.nlocations
+            return numpy.flatnonzero(medians)
+        
+        medians = medians.astype(numpy.int64, copy = False)
+        assert len(medians) == 0 or (medians.min() >= 0 and medians.max() < self.nlocations)
+        return medians
+    
+    """locations that may currently be assigned to a median without being forced, i.e., the items of its pricing problem"""
+    def allowedItems(self, median):
+        if self.candidates is None:
+            allowed = ~self.forbiddenassignments[median]
+            if self.nforced > 0:
+                allowed &= ~self.forcedassignments[median]
+            return numpy.flatnonzero(allowed)
+        
+        # only the entries of the candidates are read, the matrices may be sparse (streaming mode)
+        items = numpy.asarray(self.candidates[median])
+        allowed = ~self.forbiddenassignments[median, items]
+        if self.nforced > 0:
+            allowed &= ~self.forcedassignments[median, items]
+        return items[allowed]
         
+    """force the assignment of a certain location to a certain median: every column of the median contains the location"""
+    def forceAssignment(self, median, location):
+        assert median >= 0 and median < self.nlocations
+        assert location >= 0 and location < self.nlocations
+        assert not self.forcedassignments[median, location]
+        self.forcedassignments[median, location] = True
+        self.nforced += 1
+    
+    """release a previously forced assignment"""
+    def releaseAssignment(self, median, location):
+        assert median >= 0 and median < self.nlocations
+        assert location >= 0 and location < self.nlocations
+        assert self.forcedassignments[median, location]
+        self.forcedassignments[median, location] = False
+        self.nforced -= 1
+    
     """check whether a certain assignment is currently forbidden"""
     def isAssignmentForbidden(self,median,location):
         assert median >= 0 and median < self.nlocations
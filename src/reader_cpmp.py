@@ -16,6 +16,14 @@ Created on Mon Oct 26 17:32:43 2020
 # [demand_1] ... [demand_nlocations]
 # [capacity_1] ... [capacity_nlocations]
 
+from collections.abc import Mapping
+import itertools
+import os
+
+import numpy
+
+CACHE_SUFFIX = ".npz"
+
 def is_integer(s):
     try:
         int(s)
@@ -23,73 +31,283 @@ def is_integer(s):
     except ValueError:
         return False
 
-""" Method to read the .cpmp instances
+#
+# Compatibility views
+#
+
+# read-only (i, j) -> int view on a distance matrix, behaves like the former dictionary
+class MatrixView(Mapping):
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __getitem__(self, key):
+        i, j = key
+        return int(self.matrix[i, j])
+
+    def __iter__(self):
+        return itertools.product(range(self.matrix.shape[0]), range(self.matrix.shape[1]))
+
+    def __len__(self):
+        return self.matrix.size
+
+# read-only i -> int view on a demand or capacity vector, behaves like the former dictionary
+class VectorView(Mapping):
+    def __init__(self, vector):
+        self.vector = vector
+
+    def __getitem__(self, key):
+        return int(self.vector[key])
+
+    def __iter__(self):
+        return iter(range(len(self.vector)))
+
+    def __len__(self):
+        return len(self.vector)
+
+""" numpy array behind instance data given as array, compatibility view or dictionary
+:param data: distances, demands or capacities as returned by one of the reading methods
+:param shape: shape of the data, used if it is given as a dictionary
+"""
+def as_array(data, shape):
+    if isinstance(data, MatrixView):
+        return data.matrix
+    if isinstance(data, VectorView):
+        return data.vector
+    if isinstance(data, numpy.ndarray):
+        return data
+    
+    array = numpy.zeros(shape, dtype = numpy.int64)
+    for key, value in data.items():
+        array[key] = value
+    return array
+
+#
+# Array based reading
+#
+
+""" Path of the binary cache belonging to an instance
+:param filename: path to the .cpmp instance
+"""
+def cache_filename(filename):
+    return filename + CACHE_SUFFIX
+
+""" Parse a .cpmp instance in bulk
 :param filename: path to the instance to read
+:return: nlocations, nclusters, distances (nlocations x nlocations), demands, capacities as numpy int64 arrays
 """
-def read_instance(filename):
+def parse_instance(filename):
     with open(filename) as fp:
-        line = fp.readline()
-        
-        # Reading the first line separately to get nlocations and nclusters
-        nlocations = 0
-        nclusters = 0
-        sp = line.split()
-        if len(sp) > 0 and sp[0].isnumeric():
-            assert len(sp) == 2
-            assert is_integer(sp[0]) and is_integer(sp[1])
-            nlocations = int(sp[0])
-            nclusters = int(sp[1])
-        
-        # Reading the distance matrix
-        nlines = 0                
-        distances = {}
-        
-        ##############################################################################
-        # TODO: read in the distance matrix and store the data in distances
-        ##############################################################################
-        
-        for i in range(nlocations):
-            line = fp.readline()
-            sp = line.split()
-            if len(sp) > 0 and sp[0].isnumeric():
-                assert len(sp) == nlocations
-                is_int = True
-                for j in range(nlocations):
-                    is_int = is_int and is_integer(sp[j])
-                assert is_int
-                for j in range(nlocations):
-                    distances[i,j] = int(sp[j])
-                
-            
-        # Reading the demands
-        demands = {}
-        #############################################################################
-        # TODO: read in the demands 
-        #############################################################################
-        line = fp.readline()
-        sp = line.split()
-        if len(sp) > 0 and sp[0].isnumeric():
-            assert len(sp) == nlocations
-            for j in range(nlocations):
-                is_int = is_int and is_integer(sp[j])
-            assert is_int
-            for j in range(nlocations):
-                demands[j] = int(sp[j])
-
-          
-        # Reading the capacities
-        capacities = {}
-        #############################################################################
-        # TODO: read in the capacities
-        #############################################################################
-        line = fp.readline()
-        sp = line.split()
-        if len(sp) > 0 and sp[0].isnumeric():
-            assert len(sp) == nlocations
-            for j in range(nlocations):
-                is_int = is_int and is_integer(sp[j])
-            assert is_int
-            for j in range(nlocations):
-                capacities[j] = int(sp[j])
-        
+        data = numpy.fromstring(fp.read(), dtype=numpy.int64, sep=' ')
+
+    assert len(data) >= 2
+    nlocations = int(data[0])
+    nclusters = int(data[1])
+    assert len(data) == 2 + nlocations * nlocations + 2 * nlocations
+
+    offset = 2
+    distances = data[offset:offset + nlocations * nlocations].reshape(nlocations, nlocations)
+    offset += nlocations * nlocations
+    demands = data[offset:offset + nlocations]
+    offset += nlocations
+    capacities = data[offset:offset + nlocations]
+
+    return nlocations, nclusters, numpy.ascontiguousarray(distances), demands.copy(), capacities.copy()
+
+""" Method to read the .cpmp instances as numpy arrays, using a sidecar binary cache
+:param filename: path to the instance to read
+:param cache: if True, read the data from the cache file if it is up to date and write it otherwise
+:return: nlocations, nclusters, distances (nlocations x nlocations, first index location, second index median),
+         demands, capacities
+"""
+def read_instance_arrays(filename, cache = True):
+    cachefile = cache_filename(filename)
+
+    if cache and os.path.exists(cachefile) and os.path.getmtime(cachefile) >= os.path.getmtime(filename):
+        with numpy.load(cachefile) as data:
+            return int(data["nlocations"]), int(data["nclusters"]), data["distances"], data["demands"], data["capacities"]
+
+    nlocations, nclusters, distances, demands, capacities = parse_instance(filename)
+
+    if cache:
+        # write to a temporary file first, such that concurrent readers never see a partial cache
+        tmpfile = "{0}.{1}.tmp".format(cachefile, os.getpid())
+        try:
+            with open(tmpfile, "wb") as fp:
+                numpy.savez(fp, nlocations = nlocations, nclusters = nclusters, distances = distances, demands = demands, capacities = capacities)
+            os.replace(tmpfile, cachefile)
+        except OSError:
+            # the cache is only an optimization, e.g. the instance directory may be read-only
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
     return nlocations, nclusters, distances, demands, capacities
+
+""" Method to read the .cpmp instances
+:param filename: path to the instance to read
+:return: nlocations, nclusters and dictionary-like views distances[i,j], demands[i], capacities[i]
+"""
+def read_instance(filename, cache = True):
+    nlocations, nclusters, distances, demands, capacities = read_instance_arrays(filename, cache)
+    
+    return nlocations, nclusters, MatrixView(distances), VectorView(demands), VectorView(capacities)
+
+#
+# Streaming reading for very large instances
+#
+
+MEDIANS_SUFFIX = ".medians.npy"
+META_SUFFIX = ".meta.npz"
+# k-nearest lists of an instance in streaming mode, formatted with k
+NEAREST_SUFFIX = ".nearest{0}.npy"
+# number of matrix entries handled at once when converting or scanning an instance
+STREAM_BLOCKSIZE = 1 << 22
+
+# Instance whose distances live in a memory-mapped, median-major binary file.
+# Row m of the file holds the distances of all locations to median m, i.e., exactly the
+# column the pricing problem of median m needs; it is only read from disk when accessed.
+class StreamingInstance:
+    def __init__(self, nlocations, nclusters, medians, demands, capacities, candidates = None):
+        self.nlocations = nlocations
+        self.nclusters = nclusters
+        self.medians = medians              # memory map, first index median, second index location
+        self.demands = demands
+        self.capacities = capacities
+        self.candidates = candidates        # None or, for each median, the array of candidate locations
+
+    """distance matrix view with the usual indexing distances[location, median]"""
+    @property
+    def distances(self):
+        return self.medians.T
+
+    """locations that may be assigned to a median (all of them without sparsification)"""
+    def medianCandidates(self, median):
+        if self.candidates is None:
+            return numpy.arange(self.nlocations)
+        return self.candidates[median]
+
+""" Paths of the binary files belonging to an instance in streaming mode
+:param filename: path to the .cpmp instance
+"""
+def stream_filenames(filename):
+    return filename + MEDIANS_SUFFIX, filename + META_SUFFIX
+
+""" Path of the k-nearest lists belonging to an instance in streaming mode
+:param filename: path to the .cpmp instance
+:param knearest: number of medians kept per location
+"""
+def nearest_filename(filename, knearest):
+    return filename + NEAREST_SUFFIX.format(knearest)
+
+""" Convert a .cpmp instance once into a median-major binary without materialising the matrix in memory
+The k-nearest lists are determined during the conversion, while the distance rows of the locations are in memory;
+in the median-major binary, the distances of a location are a column, which is spread over the whole file.
+:param filename: path to the instance to convert
+:param dtype: integer type used for the distances on disk
+:param knearest: if not None, the knearest closest medians of each location are stored as well (see nearest_filename)
+"""
+def convert_instance(filename, dtype = numpy.int32, knearest = None):
+    medianfile, metafile = stream_filenames(filename)
+    tmpmedianfile = "{0}.{1}.tmp.npy".format(medianfile, os.getpid())
+    tmpmetafile = "{0}.{1}.tmp".format(metafile, os.getpid())
+    maxvalue = numpy.iinfo(dtype).max
+
+    with open(filename) as fp:
+        sp = fp.readline().split()
+        assert len(sp) == 2 and is_integer(sp[0]) and is_integer(sp[1])
+        nlocations = int(sp[0])
+        nclusters = int(sp[1])
+
+        medians = numpy.lib.format.open_memmap(tmpmedianfile, mode = "w+", dtype = dtype, shape = (nlocations, nlocations))
+        blockrows = max(1, STREAM_BLOCKSIZE // max(1, nlocations))
+        block = numpy.empty((min(blockrows, nlocations), nlocations), dtype = dtype)
+        nearest = numpy.empty((nlocations, min(knearest, nlocations)), dtype = numpy.int64) if knearest is not None else None
+
+        # read the distance rows blockwise and store them transposed
+        for start in range(0, nlocations, blockrows):
+            nrows = min(blockrows, nlocations - start)
+            for r in range(nrows):
+                row = numpy.fromstring(fp.readline(), dtype = numpy.int64, sep = ' ')
+                assert len(row) == nlocations
+                assert row.min() >= 0 and row.max() <= maxvalue
+                block[r] = row
+            medians[:, start:start + nrows] = block[:nrows].T
+            if nearest is not None:
+                nearest[start:start + nrows] = knearest_medians(block[:nrows], knearest)
+
+        demands = numpy.fromstring(fp.readline(), dtype = numpy.int64, sep = ' ')
+        assert len(demands) == nlocations
+        capacities = numpy.fromstring(fp.readline(), dtype = numpy.int64, sep = ' ')
+        assert len(capacities) == nlocations
+
+    medians.flush()
+    del medians
+
+    if nearest is not None:
+        nearestfile = nearest_filename(filename, knearest)
+        tmpnearestfile = "{0}.{1}.tmp.npy".format(nearestfile, os.getpid())
+        numpy.save(tmpnearestfile, nearest)
+        os.replace(tmpnearestfile, nearestfile)
+
+    with open(tmpmetafile, "wb") as fp:
+        numpy.savez(fp, nlocations = nlocations, nclusters = nclusters, demands = demands, capacities = capacities)
+    os.replace(tmpmedianfile, medianfile)
+    # the meta file is written last and marks the conversion as complete
+    os.replace(tmpmetafile, metafile)
+
+""" For each location, determine the k closest medians
+:param distances: distance matrix (or the distance rows of some locations), first index location, second index median
+:param k: number of medians to keep per location
+:return: array of shape (nlocations, k) with the closest medians of each location
+"""
+def knearest_medians(distances, k):
+    nlocations, nmedians = distances.shape
+    k = min(k, nmedians)
+    nearest = numpy.empty((nlocations, k), dtype = numpy.int64)
+    blockrows = max(1, STREAM_BLOCKSIZE // max(1, nmedians))
+
+    for start in range(0, nlocations, blockrows):
+        stop = min(nlocations, start + blockrows)
+        block = numpy.asarray(distances[start:stop])
+        nearest[start:stop] = numpy.argpartition(block, k - 1, axis = 1)[:, :k]
+
+    return nearest
+
+""" Invert the k-nearest lists: for each median, the sorted array of locations that keep it as candidate
+:param nearest: array of shape (nlocations, k) as returned by knearest_medians
+:param nmedians: number of medians
+"""
+def median_candidates(nearest, nmedians):
+    k = nearest.shape[1]
+    flat = nearest.ravel()
+    # a stable sort keeps the locations of each median in increasing order
+    locations = numpy.argsort(flat, kind = "stable") // k
+    indptr = numpy.cumsum(numpy.bincount(flat, minlength = nmedians))
+    return numpy.split(locations, indptr[:-1])
+
+""" Open a .cpmp instance in streaming mode, converting it to the binary format first if necessary
+The k-nearest lists are only computed by a conversion, i.e., a new k converts the instance again.
+:param filename: path to the instance to read
+:param knearest: if not None, keep only the knearest closest candidate medians per location
+:return: a StreamingInstance
+"""
+def open_instance(filename, knearest = None):
+    medianfile, metafile = stream_filenames(filename)
+    requiredfiles = [metafile, medianfile] + ([nearest_filename(filename, knearest)] if knearest is not None else [])
+
+    if not all(os.path.exists(required) and os.path.getmtime(required) >= os.path.getmtime(filename) for required in requiredfiles):
+        convert_instance(filename, knearest = knearest)
+
+    with numpy.load(metafile) as meta:
+        nlocations = int(meta["nlocations"])
+        nclusters = int(meta["nclusters"])
+        demands = meta["demands"]
+        capacities = meta["capacities"]
+
+    medians = numpy.load(medianfile, mmap_mode = "r")
+    assert medians.shape == (nlocations, nlocations)
+
+    candidates = None
+    if knearest is not None:
+        candidates = median_candidates(numpy.load(nearest_filename(filename, knearest)), nlocations)
+
+    return StreamingInstance(nlocations, nclusters, medians, demands, capacities, candidates)
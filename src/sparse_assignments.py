@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sparse matrix over the assignments of locations to medians
+
+In streaming mode (see reader_cpmp.StreamingInstance), a dense matrix over all assignments is as large as the distance
+matrix that is not held in memory. The branching decisions only forbid (resp. force) the assignments of a few locations
+per node, such that the pricer keeps them in a SparseAssignments matrix: a dictionary of the nonzero entries, with the
+indexing of the dense matrices that the pricer and the column pool use, i.e.,
+    * a single entry, matrix[median, location],
+    * the row of a median, matrix[median], or some entries of it, matrix[median, locations],
+    * entries given by arrays of medians and locations (broadcast against each other), matrix[medians, locations],
+and the assignment of entries with the same indices. Vectorized reads use sorted arrays of the nonzero entries, which
+are rebuilt after the entries changed.
+"""
+
+import numpy
+
+
+class SparseAssignments:
+    def __init__(self, nmedians, nlocations, dtype = bool):
+        self.shape = (nmedians, nlocations)
+        self.dtype = numpy.dtype(dtype)
+
+        # nonzero entries, key median * nlocations + location
+        self.entries = {}
+
+        # sorted keys of the nonzero entries and their values for the vectorized reads, rebuilt after the entries changed
+        self.dirty = False
+        self.keys = numpy.zeros(0, dtype = numpy.int64)
+        self.values = numpy.zeros(0, dtype = self.dtype)
+
+    def rebuild(self):
+        self.keys = numpy.fromiter(sorted(self.entries), dtype = numpy.int64, count = len(self.entries))
+        self.values = numpy.fromiter((self.entries[key] for key in self.keys.tolist()), dtype = self.dtype, count = len(self.keys))
+        self.dirty = False
+
+    """entries of a median"""
+    def row(self, median):
+        if self.dirty:
+            self.rebuild()
+        nlocations = self.shape[1]
+        start, stop = numpy.searchsorted(self.keys, [median * nlocations, (median + 1) * nlocations])
+
+        row = numpy.zeros(nlocations, dtype = self.dtype)
+        row[self.keys[start:stop] - median * nlocations] = self.values[start:stop]
+        return row
+
+    """entries of arrays of medians and locations of the same shape"""
+    def lookup(self, medians, locations):
+        if self.dirty:
+            self.rebuild()
+        keys = medians * self.shape[1] + locations
+
+        values = numpy.zeros(keys.shape, dtype = self.dtype)
+        if len(self.keys) > 0:
+            positions = numpy.minimum(numpy.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = self.keys[positions] == keys
+            values[found] = self.values[positions[found]]
+        return values
+
+    def __getitem__(self, index):
+        medians, locations = index if isinstance(index, tuple) else (index, slice(None))
+        if isinstance(locations, slice):
+            assert numpy.ndim(medians) == 0 and locations == slice(None)
+            return self.row(int(medians))
+        if numpy.ndim(medians) == 0 and numpy.ndim(locations) == 0:
+            return self.dtype.type(self.entries.get(int(medians) * self.shape[1] + int(locations), 0))
+
+        medians, locations = numpy.broadcast_arrays(numpy.asarray(medians, dtype = numpy.int64),
+                                                    numpy.asarray(locations, dtype = numpy.int64))
+        return self.lookup(medians, locations)
+
+    def __setitem__(self, index, value):
+        medians, locations = index
+        medians, locations, values = numpy.broadcast_arrays(numpy.asarray(medians, dtype = numpy.int64),
+                                                            numpy.asarray(locations, dtype = numpy.int64),
+                                                            numpy.asarray(value, dtype = self.dtype))
+        keys = medians * self.shape[1] + locations
+        for key, value in zip(keys.ravel().tolist(), values.ravel().tolist()):
+            if value:
+                self.entries[key] = value
+            else:
+                self.entries.pop(key, None)
+        self.dirty = True
+
+    """sums of the rows, i.e., per median (only axis = 1 is supported)"""
+    def sum(self, axis):
+        assert axis == 1
+        if self.dirty:
+            self.rebuild()
+        return numpy.bincount(self.keys // self.shape[1], weights = self.values, minlength = self.shape[0])